@@ -0,0 +1,54 @@
+import threading
+from bisect import bisect_left
+
+from api.reference import ingredient_cache
+
+
+class IngredientIndex:
+    """
+    Отсортированный индекс названий ингредиентов в памяти процесса.
+    Сначала отдает совпадения по началу названия, затем по подстроке.
+    Перестраивается при смене версии кэша справочника ингредиентов.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reference = None
+        self._entries = None
+        self._keys = None
+
+    def _get_entries(self):
+        reference = ingredient_cache.get()
+        with self._lock:
+            if self._reference is not reference:
+                self._entries = sorted(
+                    (item['name'].lower(), item['id'], item)
+                    for item in reference.data
+                )
+                self._keys = [entry[0] for entry in self._entries]
+                self._reference = reference
+            return self._entries, self._keys, reference.etag
+
+    def search(self, query, limit=None):
+        """
+        Возвращает версию индекса и найденные ингредиенты.
+        Версия зависит только от содержимого, поэтому одинакова
+        во всех процессах и годится для ETag.
+        """
+        entries, keys, version = self._get_entries()
+        query = query.lower()
+        start = bisect_left(keys, query)
+        end = start
+        while end < len(keys) and keys[end].startswith(query):
+            end += 1
+        matches = entries[start:end]
+        if limit is None or len(matches) < limit:
+            matches = matches + [
+                entry for entry in entries
+                if query in entry[0] and not entry[0].startswith(query)
+            ]
+        if limit is not None:
+            matches = matches[:limit]
+        return version, [item for _, _, item in matches]
+
+
+ingredient_index = IngredientIndex()
@@ -0,0 +1,292 @@
+import json
+import os
+import tempfile
+from collections import Counter, namedtuple
+from urllib.parse import unquote, urlparse
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import F, prefetch_related_objects
+from django.http import FileResponse
+
+from api.images import (
+    detect_image_extension,
+    schedule_image_processing,
+    strip_metadata,
+)
+from api.response_cache import invalidate_responses
+from api.serializers import RECIPE_PREFETCHES
+from recipes.models import (
+    RECIPE_SEARCH_VECTOR,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    Tag,
+)
+from users.models import User
+
+
+CHUNK_SIZE = 500
+# Выгрузка больше этого размера пишется во временный файл на диске
+EXPORT_SPOOL_SIZE = 8 * 1024 * 1024
+IMAGE_UPLOAD_TO = Recipe._meta.get_field('image').upload_to
+
+ImportResult = namedtuple('ImportResult', ('created', 'errors'))
+ImportItem = namedtuple('ImportItem', ('recipe', 'ingredients', 'tag_ids'))
+
+
+class RecordError(ValueError):
+    """
+    Ошибка в строке файла импорта.
+    """
+
+
+def required(record, key, kind):
+    value = record.get(key)
+    if not isinstance(value, kind) or isinstance(value, bool) or not value:
+        raise RecordError(f'Некорректное поле {key}.')
+    return value
+
+
+class RecipeImporter:
+    """
+    Потоковый импорт рецептов из JSON Lines.
+
+    Каждая строка - объект с полями name, text, cooking_time,
+    ingredients ([{name, measurement_unit, amount}]), tags (слаги),
+    необязательными author (username) и image. Ингредиенты и тэги
+    ищутся по словарям в памяти, рецепты сохраняются пачками
+    через bulk_create, каждая пачка - в своей транзакции.
+    """
+    def __init__(self, default_author=None, allow_local_files=False,
+                 chunk_size=CHUNK_SIZE):
+        self.default_author = default_author
+        self.allow_local_files = allow_local_files
+        self.chunk_size = chunk_size
+        self.ingredients = {}
+        self.ingredients_by_name = {}
+        for pk, name, unit in Ingredient.objects.values_list(
+            'id', 'name', 'measurement_unit'
+        ):
+            name = name.lower()
+            self.ingredients[name, unit.lower()] = pk
+            # Без единицы измерения имя должно быть однозначным
+            self.ingredients_by_name[name] = (
+                None if name in self.ingredients_by_name else pk
+            )
+        self.tags = dict(Tag.objects.values_list('slug', 'id'))
+        self.authors = {}
+
+    def get_author_id(self, username):
+        if username is None:
+            if self.default_author is None:
+                raise RecordError('Не указан автор.')
+            return self.default_author.id
+        if not isinstance(username, str):
+            raise RecordError('Некорректное поле author.')
+        if username not in self.authors:
+            self.authors[username] = User.objects.filter(
+                username=username
+            ).values_list('id', flat=True).first()
+        if self.authors[username] is None:
+            raise RecordError(f'Автор {username} не найден.')
+        return self.authors[username]
+
+    def get_ingredient_id(self, data):
+        name = required(data, 'name', str).strip().lower()
+        unit = data.get('measurement_unit')
+        if isinstance(unit, str) and unit.strip():
+            pk = self.ingredients.get((name, unit.strip().lower()))
+        else:
+            pk = self.ingredients_by_name.get(name)
+        if pk is None:
+            raise RecordError(f'Ингредиент {data["name"]} не найден.')
+        return pk
+
+    def resolve_image(self, value):
+        """
+        Имя файла в медиа-хранилище используется как есть.
+        Локальный путь или file:// URL копируется в хранилище,
+        если это разрешено (только для команды управления).
+        """
+        parsed = urlparse(value)
+        if parsed.scheme == 'file':
+            path = unquote(parsed.path)
+        elif parsed.scheme:
+            raise RecordError('Поддерживаются только локальные файлы.')
+        else:
+            path = value
+        if not os.path.isabs(path):
+            try:
+                if default_storage.exists(path):
+                    return path
+            except SuspiciousFileOperation:
+                raise RecordError(f'Недопустимый путь {value}.')
+        if not self.allow_local_files:
+            raise RecordError(f'Изображение {value} не найдено.')
+        if not os.path.isfile(path):
+            raise RecordError(f'Файл {value} не найден.')
+        if os.path.getsize(path) > settings.MAX_IMAGE_UPLOAD_SIZE:
+            raise RecordError(f'Файл {value} слишком большой.')
+        with open(path, 'rb') as file:
+            if detect_image_extension(file.read(12)) is None:
+                raise RecordError(f'Файл {value} не является изображением.')
+            try:
+                content = strip_metadata(file)
+            except OSError:
+                raise RecordError(f'Файл {value} не удалось прочитать.')
+            return default_storage.save(
+                os.path.join(IMAGE_UPLOAD_TO, os.path.basename(path)),
+                content
+            )
+
+    def parse(self, line):
+        record = json.loads(line)
+        if not isinstance(record, dict):
+            raise RecordError('Ожидался JSON-объект.')
+        name = required(record, 'name', str)
+        if len(name) > Recipe._meta.get_field('name').max_length:
+            raise RecordError('Слишком длинное название.')
+        cooking_time = required(record, 'cooking_time', int)
+        if cooking_time < 1:
+            raise RecordError('Некорректное поле cooking_time.')
+        ingredients = {}
+        for data in required(record, 'ingredients', list):
+            if not isinstance(data, dict):
+                raise RecordError('Некорректное поле ingredients.')
+            amount = required(data, 'amount', int)
+            if amount < 1:
+                raise RecordError('Некорректное количество ингредиента.')
+            pk = self.get_ingredient_id(data)
+            if pk in ingredients:
+                raise RecordError('Ингредиенты дублируются.')
+            ingredients[pk] = amount
+        tag_ids = set()
+        for slug in required(record, 'tags', list):
+            if not isinstance(slug, str) or slug not in self.tags:
+                raise RecordError(f'Тэг {slug} не найден.')
+            tag_ids.add(self.tags[slug])
+        recipe = Recipe(
+            author_id=self.get_author_id(record.get('author')),
+            name=name,
+            text=required(record, 'text', str),
+            cooking_time=cooking_time,
+        )
+        # Изображение копируется последним, когда строка уже проверена
+        if record.get('image'):
+            recipe.image = self.resolve_image(required(record, 'image', str))
+        return ImportItem(recipe, ingredients, tag_ids)
+
+    @transaction.atomic
+    def save(self, items):
+        """
+        Сохраняет пачку рецептов. bulk_create не вызывает Recipe.save,
+        поэтому поисковый вектор, счетчики авторов, кэш ответов
+        и обработка изображений обновляются здесь.
+        """
+        recipes = Recipe.objects.bulk_create(
+            [item.recipe for item in items]
+        )
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(
+                recipe=item.recipe, ingredient_id=pk, amount=amount
+            )
+            for item in items
+            for pk, amount in item.ingredients.items()
+        )
+        through = Recipe.tags.through
+        through.objects.bulk_create(
+            through(recipe=item.recipe, tag_id=tag_id)
+            for item in items
+            for tag_id in item.tag_ids
+        )
+        Recipe.objects.filter(
+            pk__in=[recipe.pk for recipe in recipes]
+        ).update(search_vector=RECIPE_SEARCH_VECTOR)
+        authors = Counter(recipe.author_id for recipe in recipes)
+        for author_id, count in authors.items():
+            User.objects.filter(pk=author_id).update(
+                recipes_count=F('recipes_count') + count
+            )
+        for recipe in recipes:
+            schedule_image_processing(recipe.image)
+        invalidate_responses()
+        return len(recipes)
+
+    def run(self, lines):
+        created = 0
+        errors = []
+        items = []
+        for number, line in enumerate(lines, 1):
+            try:
+                if isinstance(line, bytes):
+                    line = line.decode('utf-8')
+                if not line.strip():
+                    continue
+                items.append(self.parse(line))
+            except ValueError as error:
+                errors.append({'line': number, 'error': str(error)})
+            if len(items) >= self.chunk_size:
+                created += self.save(items)
+                items = []
+        if items:
+            created += self.save(items)
+        return ImportResult(created, errors)
+
+
+def recipe_record(recipe):
+    return {
+        'name': recipe.name,
+        'text': recipe.text,
+        'cooking_time': recipe.cooking_time,
+        'author': recipe.author.username,
+        'tags': [tag.slug for tag in recipe.tags.all()],
+        'ingredients': [
+            {
+                'name': row.ingredient.name,
+                'measurement_unit': row.ingredient.measurement_unit,
+                'amount': row.amount,
+            }
+            for row in recipe.recipeingredient_set.all()
+        ],
+        'image': recipe.image.name or None,
+    }
+
+
+def iter_recipe_lines(chunk_size=CHUNK_SIZE):
+    """
+    Выгружает рецепты строками JSON Lines, читая их пачками по id.
+    """
+    last_pk = 0
+    while True:
+        recipes = list(
+            Recipe.objects.filter(pk__gt=last_pk).select_related(
+                'author'
+            ).order_by('pk')[:chunk_size]
+        )
+        if not recipes:
+            return
+        prefetch_related_objects(recipes, *RECIPE_PREFETCHES)
+        for recipe in recipes:
+            yield json.dumps(recipe_record(recipe), ensure_ascii=False) + '\n'
+        last_pk = recipes[-1].pk
+
+
+def recipes_export_response():
+    """
+    Выгрузка всех рецептов файлом. Запросы к базе выполняются здесь,
+    в синхронном представлении: под ASGI тело потокового ответа
+    читается в цикле событий, где ORM недоступен.
+    """
+    file = tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_SIZE)
+    for line in iter_recipe_lines():
+        file.write(line.encode())
+    file.seek(0)
+    return FileResponse(
+        file,
+        as_attachment=True,
+        filename='recipes.jsonl',
+        content_type='application/x-ndjson; charset=utf-8'
+    )
@@ -1,6 +1,6 @@
+import io
 import os
-
-from django.http import HttpResponse
+from functools import lru_cache
 
 from reportlab.lib.pagesizes import A4
 from reportlab.pdfbase import pdfmetrics
@@ -8,17 +8,26 @@ from reportlab.pdfbase.ttfonts import TTFont
 from reportlab.pdfgen import canvas
 
 
-def generate_shopping_cart_pdf(ingredients, filename='shopping_cart.pdf'):
-    response = HttpResponse(content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+FONT_NAME = 'DejaVuSans'
+FONT_PATH = os.path.join(os.path.dirname(__file__), 'fonts', 'DejaVuSans.ttf')
 
-    p = canvas.Canvas(response, pagesize=A4)
-    width, height = A4
 
-    font_path = os.path.join(
-        os.path.dirname(__file__), 'fonts', 'DejaVuSans.ttf'
-    )
-    pdfmetrics.registerFont(TTFont('DejaVuSans', font_path))
+@lru_cache(maxsize=None)
+def register_font():
+    """
+    Регистрирует шрифт один раз на процесс.
+    """
+    pdfmetrics.registerFont(TTFont(FONT_NAME, FONT_PATH))
+
+
+def generate_shopping_cart_pdf(ingredients):
+    """
+    Возвращает PDF со списком покупок в виде байтов.
+    """
+    register_font()
+    buffer = io.BytesIO()
+    p = canvas.Canvas(buffer, pagesize=A4)
+    width, height = A4
 
     page_number = 1
 
@@ -26,16 +35,16 @@ def generate_shopping_cart_pdf(ingredients, filename='shopping_cart.pdf'):
         """
         Отрисовывает заголовок и номер страницы.
         """
-        p.setFont("DejaVuSans", 20)
+        p.setFont(FONT_NAME, 20)
         p.drawString(230, height - 90, 'Список покупок')
-        p.setFont("DejaVuSans", 16)
+        p.setFont(FONT_NAME, 16)
         p.drawString(100, height - 150, 'Ингредиенты:')
-        p.setFont("DejaVuSans", 10)
+        p.setFont(FONT_NAME, 10)
         p.drawString(width - 100, 40, f"Страница {page_number}")
 
     draw_header_footer()
 
-    p.setFont("DejaVuSans", 12)
+    p.setFont(FONT_NAME, 12)
     y_position = height - 180
     line_height = 20
 
@@ -52,7 +61,7 @@ def generate_shopping_cart_pdf(ingredients, filename='shopping_cart.pdf'):
             y_position = height - 60
             draw_header_footer()
             y_position = height - 180
-            p.setFont("DejaVuSans", 12)
+            p.setFont(FONT_NAME, 12)
 
         p.drawString(100, y_position, text)
         y_position -= line_height
@@ -60,4 +69,4 @@ def generate_shopping_cart_pdf(ingredients, filename='shopping_cart.pdf'):
     p.showPage()
     p.save()
 
-    return response
+    return buffer.getvalue()
@@ -0,0 +1,126 @@
+import csv
+import hashlib
+import io
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Sum
+from django.http import StreamingHttpResponse
+from rest_framework.negotiation import BaseContentNegotiation
+
+from api.create_pdf import generate_shopping_cart_pdf
+from recipes.models import RecipeIngredient
+
+
+CHUNK_SIZE = 64 * 1024
+
+
+class IgnoreFormatNegotiation(BaseContentNegotiation):
+    """
+    Не используем ?format= для выбора рендерера DRF:
+    этот параметр задает формат выгрузки списка покупок.
+    """
+    def select_parser(self, request, parsers):
+        return parsers[0]
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return (renderers[0], renderers[0].media_type)
+
+
+def ingredient_line(ingredient):
+    return (
+        f"{ingredient['ingredient__name']} "
+        f"({ingredient['ingredient__measurement_unit']}): "
+        f"{ingredient['total_amount']}"
+    )
+
+
+def generate_shopping_cart_txt(ingredients):
+    lines = ['Список покупок', '']
+    lines.extend(ingredient_line(ingredient) for ingredient in ingredients)
+    return ('\n'.join(lines) + '\n').encode()
+
+
+def generate_shopping_cart_csv(ingredients):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(('name', 'measurement_unit', 'amount'))
+    for ingredient in ingredients:
+        writer.writerow((
+            ingredient['ingredient__name'],
+            ingredient['ingredient__measurement_unit'],
+            ingredient['total_amount'],
+        ))
+    return buffer.getvalue().encode()
+
+
+EXPORT_FORMATS = {
+    'pdf': ('application/pdf', generate_shopping_cart_pdf),
+    'txt': ('text/plain; charset=utf-8', generate_shopping_cart_txt),
+    'csv': ('text/csv; charset=utf-8', generate_shopping_cart_csv),
+}
+
+
+def shopping_cart_ingredients(user):
+    """
+    Суммарное количество каждого ингредиента из списка покупок.
+    """
+    return RecipeIngredient.objects.filter(
+        recipe__shopping_cart__user=user
+    ).values(
+        'ingredient__name',
+        'ingredient__measurement_unit'
+    ).annotate(
+        total_amount=Sum('amount')
+    ).order_by('ingredient__name', 'ingredient__measurement_unit')
+
+
+def cart_digest(ingredients):
+    """
+    Хэш содержимого корзины: одинаковые корзины дают одинаковый ключ.
+    """
+    payload = json.dumps(
+        [ingredient_line(ingredient) for ingredient in ingredients],
+        ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def render_shopping_cart(ingredients, export_format):
+    """
+    Возвращает выгрузку из кэша или рендерит и кэширует ее.
+    """
+    ingredients = list(ingredients)
+    cache_key = (
+        f'shopping_cart:{export_format}:{cart_digest(ingredients)}'
+    )
+    content = cache.get(cache_key)
+    if content is None:
+        _, renderer = EXPORT_FORMATS[export_format]
+        content = renderer(ingredients)
+        cache.set(
+            cache_key, content, settings.SHOPPING_CART_CACHE_TIMEOUT
+        )
+    return content
+
+
+def iter_chunks(content):
+    for start in range(0, len(content), CHUNK_SIZE):
+        yield content[start:start + CHUNK_SIZE]
+
+
+def shopping_cart_response(ingredients, export_format):
+    """
+    Отдает список покупок потоком в запрошенном формате.
+    """
+    content = render_shopping_cart(ingredients, export_format)
+    content_type, _ = EXPORT_FORMATS[export_format]
+    response = StreamingHttpResponse(
+        iter_chunks(content), content_type=content_type
+    )
+    response['Content-Disposition'] = (
+        f'attachment; filename="shopping_cart.{export_format}"'
+    )
+    response['Content-Length'] = len(content)
+    return response
@@ -1,14 +1,79 @@
-import base64
+import binascii
+import tempfile
 
-from django.core.files.base import ContentFile
+from django.conf import settings
+from django.core.files import File
 from rest_framework import serializers
 
+from api.images import detect_image_extension
+
+
+BASE64_PREFIX = ';base64,'
+BASE64_CHUNK_SIZE = 64 * 1024
+
+
+def decode_base64_to_file(data, start, max_size):
+    """
+    Декодирует base64 из data[start:] кусками во временный файл,
+    не создавая копий всей строки. Прерывается при превышении max_size.
+    Пробелы и переносы строк удаляются, а неполная четверка символов
+    переносится в следующий кусок.
+    """
+    file = tempfile.TemporaryFile()
+    size = 0
+    carry = ''
+    try:
+        for offset in range(start, len(data), BASE64_CHUNK_SIZE):
+            chunk = carry + ''.join(
+                data[offset:offset + BASE64_CHUNK_SIZE].split()
+            )
+            usable = len(chunk) - len(chunk) % 4
+            carry = chunk[usable:]
+            decoded = binascii.a2b_base64(chunk[:usable])
+            size += len(decoded)
+            if size > max_size:
+                raise serializers.ValidationError(
+                    'Размер изображения превышает '
+                    f'{max_size // (1024 * 1024)} МБ.'
+                )
+            file.write(decoded)
+        if carry:
+            raise binascii.Error('Incomplete base64 data')
+    except binascii.Error:
+        file.close()
+        raise serializers.ValidationError('Не правильный формат изображения')
+    except serializers.ValidationError:
+        file.close()
+        raise
+    file.seek(0)
+    return file
+
 
 class Base64ImageField(serializers.ImageField):
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith('data:image'):
-            format, imgstr = data.split(';base64,')
-            ext = format.split('/')[-1]
-            data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
-            return super().to_internal_value(data)
+            prefix_end = data.find(BASE64_PREFIX)
+            if prefix_end == -1:
+                raise serializers.ValidationError(
+                    'Не правильный формат изображения'
+                )
+            max_size = settings.MAX_IMAGE_UPLOAD_SIZE
+            # Запас на переносы строк: точный размер проверяется при
+            # декодировании, здесь отсекаются заведомо большие строки
+            if (len(data) - prefix_end) * 3 // 4 > max_size * 21 // 20:
+                raise serializers.ValidationError(
+                    'Размер изображения превышает '
+                    f'{max_size // (1024 * 1024)} МБ.'
+                )
+            file = decode_base64_to_file(
+                data, prefix_end + len(BASE64_PREFIX), max_size
+            )
+            ext = detect_image_extension(file.read(12))
+            if ext is None:
+                file.close()
+                raise serializers.ValidationError(
+                    'Не правильный формат изображения'
+                )
+            file.seek(0)
+            return super().to_internal_value(File(file, name='temp.' + ext))
         raise serializers.ValidationError('Не правильный формат изображения')
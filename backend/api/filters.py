@@ -1,22 +1,14 @@
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db.models import F
 from django_filters.rest_framework import (
     BooleanFilter,
     CharFilter,
+    ChoiceFilter,
     FilterSet,
     ModelMultipleChoiceFilter,
 )
 
-from recipes.models import Ingredient, Recipe, Tag
-
-
-class IngredientFilter(FilterSet):
-    name = CharFilter(
-        field_name='name',
-        lookup_expr='istartswith'
-    )
-
-    class Meta:
-        model = Ingredient
-        fields = ('name',)
+from recipes.models import SEARCH_CONFIG, Recipe, Tag
 
 
 class RecipeFilter(FilterSet):
@@ -28,10 +20,34 @@ class RecipeFilter(FilterSet):
     )
     is_in_shopping_cart = BooleanFilter(method='filter_is_in_shopping_cart')
     is_favorited = BooleanFilter(method='filter_is_favorited')
+    search = CharFilter(method='filter_search')
+    ordering = ChoiceFilter(
+        choices=(('popular', 'popular'), ('trending', 'trending')),
+        method='filter_ordering'
+    )
 
     class Meta:
         model = Recipe
-        fields = ('author', 'tags', 'is_in_shopping_cart', 'is_favorited')
+        fields = (
+            'author',
+            'tags',
+            'is_in_shopping_cart',
+            'is_favorited',
+            'search',
+            'ordering'
+        )
+
+    def filter_search(self, queryset, name, value):
+        """
+        Полнотекстовый поиск по названию и описанию,
+        название весит больше описания.
+        """
+        query = SearchQuery(
+            value, config=SEARCH_CONFIG, search_type='websearch'
+        )
+        return queryset.filter(search_vector=query).annotate(
+            rank=SearchRank(F('search_vector'), query)
+        ).order_by('-rank', '-pub_date')
 
     def filter_is_in_shopping_cart(self, queryset, name, value):
         user = self.request.user    # type: ignore
@@ -48,3 +64,16 @@ class RecipeFilter(FilterSet):
                 return queryset.filter(favorites__user=user)
             return queryset.exclude(favorites__user=user)
         return queryset.none()
+
+    def filter_ordering(self, queryset, name, value):
+        """
+        popular - по числу добавлений в избранное,
+        trending - по предрассчитанному трендовому рейтингу.
+        При поиске релевантность - второй ключ сортировки.
+        """
+        rank = ('-rank',) if 'rank' in queryset.query.annotations else ()
+        if value == 'popular':
+            return queryset.order_by('-favorite_count', *rank, '-pub_date')
+        return queryset.order_by(
+            F('trend__score').desc(nulls_last=True), *rank, '-pub_date'
+        )
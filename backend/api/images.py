@@ -0,0 +1,199 @@
+import io
+import logging
+import os
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.utils import timezone
+
+from api.jobs import get_executor
+from api.response_cache import invalidate_responses
+from PIL import Image, ImageOps
+from recipes.models import Recipe
+
+
+logger = logging.getLogger(__name__)
+
+RENDITIONS = {
+    'thumbnail': (160, 160),
+    'card': (600, 600),
+}
+RENDITION_FORMATS = {
+    'webp': 'WEBP',
+    'jpeg': 'JPEG',
+}
+IMAGE_SIGNATURES = (
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'\xff\xd8\xff', 'jpg'),
+    (b'GIF87a', 'gif'),
+    (b'GIF89a', 'gif'),
+)
+
+
+def detect_image_extension(header):
+    """
+    Определяет тип изображения по первым байтам файла.
+    """
+    for signature, extension in IMAGE_SIGNATURES:
+        if header.startswith(signature):
+            return extension
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return 'webp'
+    return None
+
+
+def strip_metadata(file):
+    """
+    Поворачивает изображение по EXIF и перекодирует его без метаданных
+    (в том числе координат GPS). Вызывается до первого сохранения файла.
+    """
+    file.seek(0)
+    image = Image.open(file)
+    image_format = image.format
+    image.load()
+    image = ImageOps.exif_transpose(image)
+    buffer = io.BytesIO()
+    image.save(buffer, format=image_format, quality=90)
+    return ContentFile(buffer.getvalue())
+
+
+def replace_stored_image(instance, field):
+    """
+    Очищает от метаданных уже сохраненное изображение. Чистая копия
+    пишется под новым именем, ссылка в базе меняется после записи,
+    старый файл удаляется последним: картинка не пропадает ни на миг
+    и не теряется при ошибке записи.
+    """
+    file = getattr(instance, field)
+    old_name = file.name
+    with default_storage.open(old_name) as original:
+        content = strip_metadata(original)
+    file.save(os.path.basename(old_name), content, save=False)
+    type(instance).objects.filter(pk=instance.pk).update(
+        **{field: file.name}
+    )
+    default_storage.delete(old_name)
+    return file.name
+
+
+def load_image(name):
+    with default_storage.open(name) as file:
+        image = Image.open(file)
+        image.load()
+    return ImageOps.exif_transpose(image)
+
+
+def rendition_name(name, rendition, extension):
+    directory, filename = os.path.split(name)
+    base, _ = os.path.splitext(filename)
+    return os.path.join(
+        directory, 'renditions', f'{base}_{rendition}.{extension}'
+    )
+
+
+def rendition_urls(image, request=None):
+    """
+    Ссылки на уменьшенные копии изображения, абсолютные при наличии
+    request - так же, как ссылка на оригинал в ImageField.
+    """
+    if not image:
+        return None
+    urls = {}
+    for rendition in RENDITIONS:
+        urls[rendition] = {}
+        for extension in RENDITION_FORMATS:
+            url = default_storage.url(
+                rendition_name(image.name, rendition, extension)
+            )
+            if request is not None:
+                url = request.build_absolute_uri(url)
+            urls[rendition][extension] = url
+    return urls
+
+
+def recipe_rendition_urls(recipe, request=None):
+    """
+    Ссылки на копии картинки рецепта. Пока копии для текущей картинки
+    не созданы (задача в очереди, упала или картинка загружена раньше),
+    возвращает None - используйте оригинал.
+    """
+    if not recipe.image or recipe.renditions_image != recipe.image.name:
+        return None
+    return rendition_urls(recipe.image, request)
+
+
+def mark_renditions_ready(name):
+    """
+    Отмечает, что копии картинки созданы. Меняет updated рецепта,
+    чтобы сменился ключ его закэшированного фрагмента.
+    """
+    Recipe.objects.filter(image=name).update(
+        renditions_image=name, updated=timezone.now()
+    )
+    invalidate_responses()
+
+
+def renditions_exist(name):
+    return all(
+        default_storage.exists(rendition_name(name, rendition, extension))
+        for rendition in RENDITIONS
+        for extension in RENDITION_FORMATS
+    )
+
+
+def generate_renditions(name, original):
+    """
+    Создает копии изображения в форматах WebP и JPEG для каждого размера.
+    """
+    for rendition, size in RENDITIONS.items():
+        image = original.copy()
+        image.thumbnail(size)
+        for extension, image_format in RENDITION_FORMATS.items():
+            if image_format == 'JPEG' and image.mode != 'RGB':
+                output = image.convert('RGB')
+            else:
+                output = image
+            buffer = io.BytesIO()
+            output.save(buffer, format=image_format, quality=80)
+            path = rendition_name(name, rendition, extension)
+            if default_storage.exists(path):
+                default_storage.delete(path)
+            default_storage.save(path, ContentFile(buffer.getvalue()))
+
+
+def process_image(name):
+    """
+    Создание уменьшенных копий картинки рецепта и отметка о них.
+    Метаданные удалены еще при загрузке. Возвращает False,
+    если обработка не удалась.
+    """
+    try:
+        generate_renditions(name, load_image(name))
+        mark_renditions_ready(name)
+    except Exception:
+        logger.exception('Ошибка обработки изображения %s', name)
+        return False
+    return True
+
+
+def run_image_processing(name):
+    """
+    Фоновая задача: закрывает соединение с базой своего потока.
+    """
+    try:
+        process_image(name)
+    finally:
+        connection.close()
+
+
+def schedule_image_processing(image):
+    """
+    Ставит создание копий картинки в фоновый пул после коммита транзакции.
+    """
+    if not image:
+        return
+    name = image.name
+    transaction.on_commit(
+        lambda: get_executor().submit(run_image_processing, name)
+    )
@@ -0,0 +1,102 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from functools import lru_cache
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from django.utils import timezone
+
+from api.export import render_shopping_cart, shopping_cart_ingredients
+from recipes.models import ShoppingCartExport
+
+
+logger = logging.getLogger(__name__)
+
+
+@lru_cache(maxsize=None)
+def get_executor():
+    """
+    Пул потоков процесса для фоновых задач
+    (выгрузка списков покупок, обработка изображений).
+    """
+    return ThreadPoolExecutor(
+        max_workers=settings.BACKGROUND_WORKERS,
+        thread_name_prefix='foodgram-background'
+    )
+
+
+def run_export(export_id):
+    """
+    Рендерит выгрузку и сохраняет файл в медиа-хранилище.
+    Медиа раздаются без авторизации, поэтому имя файла случайное.
+    """
+    try:
+        export = ShoppingCartExport.objects.select_related('user').get(
+            id=export_id
+        )
+        content = render_shopping_cart(
+            shopping_cart_ingredients(export.user), export.export_format
+        )
+        export.file.save(
+            f'{uuid4().hex}.{export.export_format}',
+            ContentFile(content),
+            save=False
+        )
+        export.status = ShoppingCartExport.DONE
+        export.save(update_fields=('file', 'status'))
+    except Exception:
+        logger.exception('Ошибка выгрузки списка покупок %s', export_id)
+        ShoppingCartExport.objects.filter(id=export_id).update(
+            status=ShoppingCartExport.FAILED
+        )
+    finally:
+        connection.close()
+
+
+def start_export(user, export_format):
+    """
+    Создает задачу выгрузки и ставит ее в пул после коммита транзакции.
+    """
+    export = ShoppingCartExport.objects.create(
+        user=user, export_format=export_format
+    )
+    transaction.on_commit(
+        lambda: get_executor().submit(run_export, export.id)
+    )
+    return export
+
+
+def expire_export(export):
+    """
+    Выгрузка, не завершенная за BACKGROUND_JOB_TIMEOUT, считается
+    неудачной: очередь пула теряется при перезапуске процесса.
+    """
+    deadline = timezone.now() - timedelta(
+        seconds=settings.BACKGROUND_JOB_TIMEOUT
+    )
+    if export.status == ShoppingCartExport.PENDING and (
+        export.created < deadline
+    ):
+        ShoppingCartExport.objects.filter(
+            id=export.id, status=ShoppingCartExport.PENDING
+        ).update(status=ShoppingCartExport.FAILED)
+        export.status = ShoppingCartExport.FAILED
+    return export
+
+
+def cleanup_exports():
+    """
+    Удаляет выгрузки старше SHOPPING_CART_EXPORT_TTL вместе с файлами,
+    в том числе неудачные и зависшие. Возвращает число удаленных.
+    """
+    deadline = timezone.now() - timedelta(
+        seconds=settings.SHOPPING_CART_EXPORT_TTL
+    )
+    exports = ShoppingCartExport.objects.filter(created__lt=deadline)
+    for export in exports.exclude(file='').iterator():
+        export.file.delete(save=False)
+    deleted, _ = exports.delete()
+    return deleted
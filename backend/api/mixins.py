@@ -1,41 +1,246 @@
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.http import Http404, HttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.utils.http import http_date, quote_etag
 from rest_framework import status
 from rest_framework.response import Response
 
-from recipes.models import Recipe
+from api.response_cache import (
+    is_cacheable,
+    overlay_user_flags,
+    response_cache_key,
+    store_response,
+)
+from api.serializers import RecipeIdsSerializer
+from recipes.models import Favorite, Recipe, ShoppingCart
+
+
+RECIPE_COUNTERS = {
+    Favorite: 'favorite_count',
+    ShoppingCart: 'shopping_cart_count',
+}
+
+
+ADD_TO_LIST_SQL = (
+    'WITH inserted AS ('
+    'INSERT INTO {list_table} ({user}, {recipe}, {created}) '
+    'SELECT %s, {pk}, %s FROM {recipe_table} WHERE {pk} = ANY(%s) '
+    'ON CONFLICT DO NOTHING RETURNING {recipe}) '
+    'UPDATE {recipe_table} SET {counter} = {counter} + 1 '
+    'WHERE {pk} IN (SELECT {recipe} FROM inserted) '
+    'RETURNING {returning}'
+)
+REMOVE_FROM_LIST_SQL = (
+    'WITH deleted AS ('
+    'DELETE FROM {list_table} WHERE {user} = %s{recipe_filter} '
+    'RETURNING {recipe}) '
+    # Счетчик мог разойтись со списком (записи из админки), не уходим ниже 0
+    'UPDATE {recipe_table} SET {counter} = GREATEST({counter} - 1, 0) '
+    'WHERE {pk} IN (SELECT {recipe} FROM deleted) '
+    'RETURNING {pk}'
+)
+# Поля рецепта, которые возвращаются после добавления в список,
+# в порядке объявления в модели (этого требует Model.from_db)
+LIST_RECIPE_FIELDS = (
+    'id', 'name', 'image', 'cooking_time', 'renditions_image'
+)
+
+
+def list_sql(template, model_class, **kwargs):
+    quote = connection.ops.quote_name
+    meta = model_class._meta
+    return template.format(
+        list_table=quote(meta.db_table),
+        user=quote(meta.get_field('user').column),
+        recipe=quote(meta.get_field('recipe').column),
+        created=quote(meta.get_field('created').column),
+        recipe_table=quote(Recipe._meta.db_table),
+        pk=quote(Recipe._meta.pk.column),
+        counter=quote(RECIPE_COUNTERS[model_class]),
+        returning=', '.join(
+            quote(Recipe._meta.get_field(name).column)
+            for name in LIST_RECIPE_FIELDS
+        ),
+        **kwargs
+    )
+
+
+def add_recipes_to_list(model_class, user, recipe_ids):
+    """
+    Добавляет рецепты в список и увеличивает их счетчики одним
+    запросом INSERT ... ON CONFLICT DO NOTHING. Возвращает только
+    добавленные рецепты: уже добавленные и несуществующие пропускаются.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            list_sql(ADD_TO_LIST_SQL, model_class),
+            [user.id, timezone.now(), list(recipe_ids)]
+        )
+        return [
+            Recipe.from_db(connection.alias, LIST_RECIPE_FIELDS, row)
+            for row in cursor.fetchall()
+        ]
+
+
+def remove_recipes_from_list(model_class, user, recipe_ids=None):
+    """
+    Удаляет рецепты из списка (все, если recipe_ids не передан)
+    и уменьшает их счетчики одним запросом.
+    Возвращает id удаленных рецептов.
+    """
+    params = [user.id]
+    recipe_filter = ''
+    if recipe_ids is not None:
+        recipe_filter = ' AND {} = ANY(%s)'.format(
+            connection.ops.quote_name(
+                model_class._meta.get_field('recipe').column
+            )
+        )
+        params.append(list(recipe_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            list_sql(
+                REMOVE_FROM_LIST_SQL, model_class, recipe_filter=recipe_filter
+            ),
+            params
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def parse_recipe_id(pk):
+    if not str(pk).isdigit():
+        raise Http404
+    return int(pk)
 
 
 class ManageListMixin:
     """
     Общий миксин для добавления и удаления рецептов в списках
-    (избранное, корзина покупок).
+    (избранное, корзина покупок). Повторные запросы безопасны:
+    уникальные ограничения не дают создать дубликат, а счетчик
+    меняется в том же запросе, что и список.
     """
     def add_to_list(self, request, model_class, serializer_class, pk):
-        recipe = get_object_or_404(Recipe, id=pk)
-        if model_class.objects.filter(
-            user=request.user,
-            recipe=recipe
-        ).exists():
+        recipes = add_recipes_to_list(
+            model_class, request.user, [parse_recipe_id(pk)]
+        )
+        if not recipes:
+            get_object_or_404(Recipe, id=pk)
             return Response(
                 {'error': 'Рецепт уже добавлен в список'},
                 status=status.HTTP_400_BAD_REQUEST
             )
-
-        obj, created = model_class.objects.get_or_create(
-            user=request.user,
-            recipe=recipe)
-        serializer = serializer_class(recipe)
+        serializer = serializer_class(recipes[0])
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     def remove_from_list(self, request, model_class, pk):
-        recipe = get_object_or_404(Recipe, id=pk)
-        if not model_class.objects.filter(
-                user=request.user,
-                recipe=recipe
-        ).exists():
+        if not remove_recipes_from_list(
+            model_class, request.user, [parse_recipe_id(pk)]
+        ):
+            get_object_or_404(Recipe, id=pk)
             return Response(
                 {'error': 'У вас нет рецепта'},
                 status=status.HTTP_400_BAD_REQUEST)
-        obj = get_object_or_404(model_class, user=request.user, recipe=recipe)
-        obj.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
+
+    def batch_list(self, request, model_class):
+        """
+        Добавляет (POST) или удаляет (DELETE) несколько рецептов
+        одной транзакцией и возвращает результат по каждому id.
+        """
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        recipe_ids = list(dict.fromkeys(serializer.validated_data['recipes']))
+        with transaction.atomic():
+            if request.method == 'POST':
+                done_status, skipped_status = 'added', 'already_added'
+                done = {
+                    recipe.pk for recipe in add_recipes_to_list(
+                        model_class, request.user, recipe_ids
+                    )
+                }
+            else:
+                done_status, skipped_status = 'removed', 'not_in_list'
+                done = set(remove_recipes_from_list(
+                    model_class, request.user, recipe_ids
+                ))
+            existing = set(Recipe.objects.filter(
+                pk__in=set(recipe_ids) - done
+            ).values_list('pk', flat=True))
+        results = []
+        for recipe_id in recipe_ids:
+            if recipe_id in done:
+                result = done_status
+            elif recipe_id in existing:
+                result = skipped_status
+            else:
+                result = 'not_found'
+            results.append({'id': recipe_id, 'status': result})
+        return Response({'results': results})
+
+    def clear_list(self, request, model_class):
+        """
+        Удаляет все рецепты пользователя из списка одним запросом.
+        """
+        removed = remove_recipes_from_list(model_class, request.user)
+        return Response({'results': [
+            {'id': recipe_id, 'status': 'removed'}
+            for recipe_id in sorted(removed)
+        ]})
+
+
+class CachedReferenceMixin:
+    """
+    Миксин для справочников (теги, ингредиенты): отдает готовый JSON
+    из кэша в памяти процесса с заголовками ETag и Last-Modified.
+    """
+    reference_cache = None
+
+    def list(self, request, *args, **kwargs):
+        reference = self.reference_cache.get()
+        response = HttpResponse(
+            reference.content, content_type='application/json'
+        )
+        response['ETag'] = quote_etag(reference.etag)
+        response['Last-Modified'] = http_date(reference.version)
+        return response
+
+    def retrieve(self, request, *args, **kwargs):
+        reference = self.reference_cache.get()
+        try:
+            pk = int(kwargs[self.lookup_field])
+            item = reference.by_id[pk]
+        except (KeyError, ValueError):
+            raise Http404
+        return Response(item)
+
+
+class CachedRecipeResponseMixin:
+    """
+    Миксин кэша ответов списка и детальной страницы рецептов.
+    В кэше хранится ответ для анонимного пользователя, для
+    авторизованного поверх него проставляются личные флаги.
+    """
+    def cached_response(self, handler, request, *args, **kwargs):
+        if not is_cacheable(request):
+            return handler(request, *args, **kwargs)
+        key = response_cache_key(request)
+        data = cache.get(key)
+        if data is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code == status.HTTP_200_OK:
+                store_response(key, response.data)
+            return response
+        if request.user.is_authenticated:
+            data = overlay_user_flags(data, request.user)
+        return Response(data)
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            super().retrieve, request, *args, **kwargs
+        )
@@ -1,4 +1,5 @@
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import CursorPagination, PageNumberPagination
 from rest_framework.response import Response
 
 
@@ -14,3 +15,36 @@ class RecipePagination(PageNumberPagination):
             'count': self.page.paginator.count,
             'results': data
         })
+
+
+class RecipeCursorPagination(CursorPagination):
+    """
+    Курсорная пагинация ленты рецептов по (pub_date, id):
+    страница за постоянное время на любой глубине и без COUNT(*).
+    Порядок только по дате: сортировка (ordering) и поиск по
+    релевантности (search) отклоняются, иначе курсор молча заменил бы
+    их порядок своим.
+    """
+    page_size_query_param = 'limit'
+    max_page_size = 100
+    ordering = ('-pub_date', '-id')
+    unsupported_params = ('ordering', 'search')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        params = [
+            param for param in self.unsupported_params
+            if param in request.query_params
+        ]
+        if params:
+            raise ValidationError({
+                param: 'Не поддерживается с курсорной пагинацией.'
+                for param in params
+            })
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data
+        })
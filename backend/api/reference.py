@@ -0,0 +1,75 @@
+import hashlib
+import threading
+import time
+from collections import namedtuple
+
+from django.conf import settings
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from api.serializers import IngredientSerializer, TagSerializer
+from recipes.models import Ingredient, ReferenceVersion, Tag
+
+
+ReferenceData = namedtuple(
+    'ReferenceData', ('version', 'data', 'by_id', 'content', 'etag')
+)
+
+
+class ReferenceCache:
+    """
+    Версионированный кэш справочника в памяти процесса.
+    Версия - время изменения справочника в таблице ReferenceVersion,
+    ее обновляют сигналы и management-команды в той же транзакции,
+    что и данные. Процесс сверяет версию с базой не чаще раза
+    в REFERENCE_CACHE_CHECK_INTERVAL секунд.
+    """
+    def __init__(self, model, serializer_class):
+        self.model = model
+        self.serializer_class = serializer_class
+        self.name = model._meta.label_lower
+        self._lock = threading.Lock()
+        self._entry = None
+        self._checked = None
+
+    def invalidate(self):
+        ReferenceVersion.objects.update_or_create(
+            name=self.name, defaults={'updated': timezone.now()}
+        )
+        with self._lock:
+            self._entry = None
+            self._checked = None
+
+    def get_version(self):
+        version, _ = ReferenceVersion.objects.get_or_create(name=self.name)
+        return version.updated.timestamp()
+
+    def get(self):
+        now = time.monotonic()
+        with self._lock:
+            if self._entry is not None and self._checked is not None and (
+                now - self._checked < settings.REFERENCE_CACHE_CHECK_INTERVAL
+            ):
+                return self._entry
+        version = self.get_version()
+        with self._lock:
+            self._checked = now
+            if self._entry is None or self._entry.version != version:
+                data = self.serializer_class(
+                    self.model.objects.order_by('pk'), many=True
+                ).data
+                content = JSONRenderer().render(data)
+                self._entry = ReferenceData(
+                    version=version,
+                    data=data,
+                    by_id={item['id']: item for item in data},
+                    content=content,
+                    etag=hashlib.md5(
+                        content, usedforsecurity=False
+                    ).hexdigest(),
+                )
+            return self._entry
+
+
+tag_cache = ReferenceCache(Tag, TagSerializer)
+ingredient_cache = ReferenceCache(Ingredient, IngredientSerializer)
@@ -0,0 +1,151 @@
+import copy
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from recipes.models import Favorite, ReferenceVersion, ShoppingCart, Subscribe
+
+
+# Фильтры, результат которых зависит от пользователя
+USER_FILTERS = ('is_favorited', 'is_in_shopping_cart')
+
+
+class CacheGeneration:
+    """
+    Поколение кэша, общее для всех процессов (воркеров сервера
+    и management-команд). Хранится в таблице ReferenceVersion,
+    процесс сверяет его с базой не чаще раза
+    в REFERENCE_CACHE_CHECK_INTERVAL секунд.
+    """
+    def __init__(self, name):
+        self.name = name
+        self._lock = threading.Lock()
+        self._value = None
+        self._checked = None
+
+    def get(self):
+        now = time.monotonic()
+        with self._lock:
+            if self._value is not None and self._checked is not None and (
+                now - self._checked < settings.REFERENCE_CACHE_CHECK_INTERVAL
+            ):
+                return self._value
+        version, _ = ReferenceVersion.objects.get_or_create(name=self.name)
+        with self._lock:
+            self._value = version.updated.timestamp()
+            self._checked = now
+            return self._value
+
+    def reset(self):
+        with self._lock:
+            self._value = None
+            self._checked = None
+
+    def bump(self):
+        ReferenceVersion.objects.update_or_create(
+            name=self.name, defaults={'updated': timezone.now()}
+        )
+        self.reset()
+
+    def invalidate(self):
+        """
+        Новое поколение записывается после коммита транзакции
+        с изменениями, чтобы не держать блокировку строки до коммита.
+        """
+        transaction.on_commit(self.bump)
+
+
+response_generation = CacheGeneration('recipes:responses')
+fragment_generation = CacheGeneration('recipes:fragments')
+
+
+def invalidate_responses():
+    """
+    Сбрасывает все закэшированные ответы рецептов после коммита.
+    """
+    response_generation.invalidate()
+
+
+def invalidate_fragments():
+    """
+    Сбрасывает фрагменты всех рецептов (изменились теги, ингредиенты
+    или данные авторов). Изменение самого рецепта меняет только его ключ.
+    """
+    fragment_generation.invalidate()
+
+
+def fragment_cache_keys(serializer, recipes, request):
+    """
+    Ключи фрагментов: id рецепта и время его изменения.
+    """
+    prefix = 'recipes:fragments:{}:{}:{}'.format(
+        fragment_generation.get(),
+        type(serializer).__name__,
+        request.get_host() if request else '',
+    )
+    return [
+        f'{prefix}:{recipe.pk}:{recipe.updated.timestamp()}'
+        for recipe in recipes
+    ]
+
+
+def response_cache_key(request):
+    url = request.build_absolute_uri()
+    digest = hashlib.md5(url.encode(), usedforsecurity=False).hexdigest()
+    return f'recipes:responses:{response_generation.get()}:{digest}'
+
+
+def is_cacheable(request):
+    return not any(name in request.query_params for name in USER_FILTERS)
+
+
+def recipe_items(data):
+    if 'results' in data:
+        return data['results']
+    return [data]
+
+
+def anonymous_copy(data):
+    """
+    Копия ответа, какой ее видит анонимный пользователь.
+    """
+    data = copy.deepcopy(data)
+    for item in recipe_items(data):
+        item['is_favorited'] = False
+        item['is_in_shopping_cart'] = False
+        item['author']['is_subscribed'] = False
+    return data
+
+
+def overlay_user_flags(data, user):
+    """
+    Проставляет в закэшированном ответе флаги текущего пользователя.
+    """
+    items = recipe_items(data)
+    recipe_ids = [item['id'] for item in items]
+    author_ids = {item['author']['id'] for item in items}
+    favorited = set(Favorite.objects.filter(
+        user=user, recipe_id__in=recipe_ids
+    ).values_list('recipe_id', flat=True))
+    in_shopping_cart = set(ShoppingCart.objects.filter(
+        user=user, recipe_id__in=recipe_ids
+    ).values_list('recipe_id', flat=True))
+    subscribed = set(Subscribe.objects.filter(
+        subscriber=user, subscribed_to_id__in=author_ids
+    ).values_list('subscribed_to_id', flat=True))
+    for item in items:
+        item['is_favorited'] = item['id'] in favorited
+        item['is_in_shopping_cart'] = item['id'] in in_shopping_cart
+        item['author']['is_subscribed'] = (
+            item['author']['id'] in subscribed
+        )
+    return data
+
+
+def store_response(key, data):
+    cache.set(key, anonymous_copy(data), settings.RESPONSE_CACHE_TIMEOUT)
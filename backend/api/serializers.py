@@ -1,9 +1,15 @@
 from collections import Counter
 
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Prefetch, prefetch_related_objects
 from djoser.serializers import UserCreateSerializer, UserSerializer
 from rest_framework import serializers
 
 from api.fields import Base64ImageField
+from api.images import recipe_rendition_urls
+from api.response_cache import fragment_cache_keys
 from recipes.models import (
     Favorite,
     Ingredient,
@@ -62,6 +68,8 @@ class CustomUserSerializer(UserSerializer):
         )
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         request = self.context.get('request')
         if request and request.user.is_authenticated:
             return Subscribe.objects.filter(
@@ -118,6 +126,49 @@ class RecipeIngredientSerializer(serializers.ModelSerializer):
         read_only_fields = ('id',)
 
 
+RECIPE_PREFETCHES = (
+    'tags',
+    Prefetch(
+        'recipeingredient_set',
+        queryset=RecipeIngredient.objects.select_related('ingredient')
+    ),
+)
+
+
+class RecipeListSerializer(serializers.ListSerializer):
+    """
+    Список рецептов с кэшем фрагментов: независимая от пользователя
+    часть каждого рецепта берется из кэша одним запросом на страницу,
+    поверх нее проставляются флаги пользователя.
+    """
+    def to_representation(self, data):
+        recipes = list(data.all() if hasattr(data, 'all') else data)
+        keys = fragment_cache_keys(
+            self.child, recipes, self.context.get('request')
+        )
+        fragments = cache.get_many(keys)
+        misses = [
+            recipe for recipe, key in zip(recipes, keys)
+            if key not in fragments
+        ]
+        prefetch_related_objects(misses, *RECIPE_PREFETCHES)
+        new_fragments = {}
+        representation = []
+        for recipe, key in zip(recipes, keys):
+            item = fragments.get(key)
+            if item is None:
+                item = self.child.to_representation(recipe)
+                new_fragments[key] = item
+            else:
+                item = self.child.overlay_user_fields(item, recipe)
+            representation.append(item)
+        if new_fragments:
+            cache.set_many(
+                new_fragments, settings.FRAGMENT_CACHE_TIMEOUT
+            )
+        return representation
+
+
 class RecipeSerializer(serializers.ModelSerializer):
     """
     Сериализатор для GET запросов Рецепта.
@@ -130,8 +181,32 @@ class RecipeSerializer(serializers.ModelSerializer):
     tags = TagSerializer(many=True, read_only=True)
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
+    image_renditions = serializers.SerializerMethodField()
+
+    def get_image_renditions(self, obj):
+        return recipe_rendition_urls(obj, self.context.get('request'))
+
+    def overlay_user_fields(self, fragment, obj):
+        """
+        Копия закэшированного фрагмента с флагами текущего пользователя.
+        """
+        item = dict(fragment)
+        if 'is_favorited' in item:
+            item['is_favorited'] = self.get_is_favorited(obj)
+        if 'is_in_shopping_cart' in item:
+            item['is_in_shopping_cart'] = self.get_is_in_shopping_cart(obj)
+        if 'author' in item:
+            item['author'] = dict(
+                item['author'],
+                is_subscribed=self.fields['author'].get_is_subscribed(
+                    obj.author
+                )
+            )
+        return item
 
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         user = self.context['request'].user
         if user.is_authenticated:
             return Favorite.objects.filter(
@@ -141,6 +216,8 @@ class RecipeSerializer(serializers.ModelSerializer):
         return False
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         request = self.context.get('request')
         if request and request.user.is_authenticated:
             return ShoppingCart.objects.filter(
@@ -160,18 +237,19 @@ class RecipeSerializer(serializers.ModelSerializer):
             'is_in_shopping_cart',
             'name',
             'image',
+            'image_renditions',
             'text',
             'cooking_time'
         )
+        list_serializer_class = RecipeListSerializer
 
 
 class RecipeIngredientCreateSerializer(serializers.ModelSerializer):
     """
     Сериализатор RecipeIngredient для создания рецепта.
     """
-    id = serializers.PrimaryKeyRelatedField(
-        queryset=Ingredient.objects.all()
-    )
+    # Ингредиенты загружаются одним запросом в RecipeCreateSerializer
+    id = serializers.IntegerField()
 
     class Meta:
         model = RecipeIngredient
@@ -192,10 +270,7 @@ class RecipeCreateSerializer(RecipeSerializer):
     ingredients = RecipeIngredientCreateSerializer(
         many=True,
     )
-    tags = serializers.PrimaryKeyRelatedField(
-        queryset=Tag.objects.all(),
-        many=True,
-    )
+    tags = serializers.ListField(child=serializers.IntegerField())
     image = Base64ImageField(allow_null=True)
 
     class Meta:
@@ -209,19 +284,27 @@ class RecipeCreateSerializer(RecipeSerializer):
             'ingredients',
             'name',
             'image',
+            'image_renditions',
             'text',
             'cooking_time'
         )
 
     def to_representation(self, obj):
         self.fields.pop('ingredients')
+        self.fields.pop('tags')
         representation = super().to_representation(obj)
+        ingredients = getattr(obj, 'saved_ingredients', None)
+        if ingredients is None:
+            ingredients = RecipeIngredient.objects.filter(
+                recipe=obj
+            ).select_related('ingredient')
         representation['ingredients'] = RecipeIngredientSerializer(
-            RecipeIngredient.objects.filter(recipe=obj).all(), many=True
+            ingredients, many=True
         ).data
-        tags = obj.tags.all()
-        tags_representation = TagSerializer(tags, many=True).data
-        representation['tags'] = tags_representation
+        tags = getattr(obj, 'saved_tags', None)
+        if tags is None:
+            tags = obj.tags.all()
+        representation['tags'] = TagSerializer(tags, many=True).data
         return representation
 
     def validate(self, data):
@@ -233,48 +316,110 @@ class RecipeCreateSerializer(RecipeSerializer):
             raise serializers.ValidationError(
                 'Количество ингредиентов должно быть больше чем 1.'
             )
-        ingredients_data = data.get('ingredients', [])
         ingredient_ids = [
-            ingredient['id'].id
-            for ingredient in ingredients_data
+            ingredient['id'] for ingredient in data['ingredients']
         ]
         ingredient_counts = Counter(ingredient_ids)
         for count_ingr in ingredient_counts.values():
             if count_ingr > 1:
                 raise serializers.ValidationError('Ингредиенты дублируются.')
-        tags_data = data.get('tags', [])
-        tags_count = Counter(tags_data)
+        tags_count = Counter(data['tags'])
         for count_tags in tags_count.values():
             if count_tags > 1:
                 raise serializers.ValidationError('Тэги дублируются.')
+        ingredients = self.resolve_ids(
+            Ingredient, ingredient_ids, 'ingredients', 'Ингредиенты'
+        )
+        for ingredient_data in data['ingredients']:
+            ingredient_data['id'] = ingredients[ingredient_data['id']]
+        tags = self.resolve_ids(Tag, data['tags'], 'tags', 'Тэги')
+        data['tags'] = [tags[tag_id] for tag_id in data['tags']]
         return data
 
-    def recipe_ingredients(self, instance, ingredients_data):
-        ingredients = [
-            RecipeIngredient(
-                recipe=instance,
-                ingredient_id=ingredient_data['id'].id,
-                amount=ingredient_data['amount']
+    def resolve_ids(self, model, ids, field, label):
+        """
+        Загружает объекты одним IN-запросом и сообщает
+        сразу обо всех несуществующих id.
+        """
+        objects = model.objects.in_bulk(ids)
+        missing = [pk for pk in ids if pk not in objects]
+        if missing:
+            raise serializers.ValidationError({field: (
+                f'{label} не найдены: {", ".join(map(str, missing))}.'
+            )})
+        return objects
+
+    def save_ingredients(self, instance, ingredients_data, created=False):
+        """
+        Приводит ингредиенты рецепта к переданным: меняет количество
+        у существующих строк, добавляет новые и удаляет лишние.
+        Текущие строки берутся из prefetch, если он уже выполнен.
+        """
+        existing = {} if created else {
+            row.ingredient_id: row
+            for row in instance.recipeingredient_set.all()
+        }
+        rows, new_rows, changed_rows = [], [], []
+        for ingredient_data in ingredients_data:
+            ingredient = ingredient_data['id']
+            amount = ingredient_data['amount']
+            row = existing.pop(ingredient.id, None)
+            if row is None:
+                row = RecipeIngredient(recipe=instance, amount=amount)
+                new_rows.append(row)
+            elif row.amount != amount:
+                row.amount = amount
+                changed_rows.append(row)
+            row.ingredient = ingredient
+            rows.append(row)
+        if existing:
+            RecipeIngredient.objects.filter(
+                pk__in=[row.pk for row in existing.values()]
+            ).delete()
+        if changed_rows:
+            RecipeIngredient.objects.bulk_update(changed_rows, ['amount'])
+        if new_rows:
+            RecipeIngredient.objects.bulk_create(new_rows)
+        instance.saved_ingredients = rows
+
+    def save_tags(self, instance, tags, created=False):
+        """
+        Добавляет и удаляет только изменившиеся связи с тэгами.
+        """
+        through = Recipe.tags.through
+        current = set() if created else {
+            tag.id for tag in instance.tags.all()
+        }
+        tag_ids = {tag.id for tag in tags}
+        if current - tag_ids:
+            through.objects.filter(
+                recipe=instance, tag_id__in=current - tag_ids
+            ).delete()
+        if tag_ids - current:
+            through.objects.bulk_create(
+                through(recipe=instance, tag_id=tag_id)
+                for tag_id in tag_ids - current
             )
-            for ingredient_data in ingredients_data
-        ]
-        return RecipeIngredient.objects.bulk_create(ingredients)
+        instance.saved_tags = tags
 
+    @transaction.atomic
     def create(self, validated_data):
         author = self.context['request'].user
         tags = validated_data.pop('tags')
         ingredients_data = validated_data.pop('ingredients')
         recipe = Recipe.objects.create(author=author, **validated_data)
-        recipe.tags.set(tags)
-        self.recipe_ingredients(recipe, ingredients_data)
+        self.save_tags(recipe, tags, created=True)
+        self.save_ingredients(recipe, ingredients_data, created=True)
+        # Новый рецепт еще никто не добавил в избранное и корзину
+        recipe.is_favorited = False
+        recipe.is_in_shopping_cart = False
+        author.is_subscribed = False
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
-        RecipeIngredient.objects.filter(recipe=instance).delete()
-        ingredients_data = validated_data.pop('ingredients')
-        self.recipe_ingredients(instance, ingredients_data)
-        tags = validated_data.pop('tags')
-        instance.tags.set(tags)
+        self.save_ingredients(instance, validated_data.pop('ingredients'))
+        self.save_tags(instance, validated_data.pop('tags'))
         return super().update(instance, validated_data)
 
 
@@ -282,9 +427,14 @@ class RecipeSubscriptionSerializer(serializers.ModelSerializer):
     """
     Сериализатор для модели Recipe с ограниченным набором полей.
     """
+    image_renditions = serializers.SerializerMethodField()
+
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_renditions', 'cooking_time')
+
+    def get_image_renditions(self, obj):
+        return recipe_rendition_urls(obj, self.context.get('request'))
 
 
 class FavoriteRecipeSerializer(RecipeSerializer):
@@ -300,7 +450,7 @@ class SubscribeSerializer(CustomUserSerializer):
     Сериализатор для модели Подписки.
     """
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.SerializerMethodField()
+    recipes_count = serializers.IntegerField(read_only=True)
 
     class Meta(CustomUserSerializer.Meta):
         fields = (
@@ -325,17 +475,16 @@ class SubscribeSerializer(CustomUserSerializer):
             'recipes_count'
         )
 
-    def get_recipes_count(self, obj):
-        return Recipe.objects.filter(author=obj).count()
-
     def get_recipes(self, obj):
-        recipes_limit = self.context['request'].query_params.get(
-            'recipes_limit'
-        )
-        recipe_user = Recipe.objects.filter(author=obj)
-
-        if recipes_limit is not None:
-            recipe_user = recipe_user[:int(recipes_limit)]
+        if hasattr(obj, 'limited_recipes'):
+            recipe_user = obj.limited_recipes
+        else:
+            recipes_limit = self.context['request'].query_params.get(
+                'recipes_limit'
+            )
+            recipe_user = Recipe.objects.filter(author=obj)
+            if recipes_limit is not None:
+                recipe_user = recipe_user[:int(recipes_limit)]
 
         serializer = RecipeSubscriptionSerializer(
             recipe_user,
@@ -345,6 +494,17 @@ class SubscribeSerializer(CustomUserSerializer):
         return serializer.data
 
 
+class RecipeIdsSerializer(serializers.Serializer):
+    """
+    Список id рецептов для пакетных операций с избранным и корзиной.
+    """
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.BATCH_MAX_RECIPES,
+    )
+
+
 class ShoppingCartSerializer(serializers.ModelSerializer):
     """
     Сериализатор для модели ShoppingCart.
@@ -0,0 +1,63 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+from recipes.models import ShortLink
+
+
+SHORT_LINK_CACHE_SIZE = 4096
+
+
+class ShortLinkCache:
+    """
+    LRU-кэш кодов коротких ссылок (код - id рецепта) в памяти процесса.
+    Читается прямо в асинхронном представлении, без перехода в поток.
+    Удаленная ссылка вытесняется сигналом в своем процессе, а в других
+    живет не дольше SHORT_LINK_CACHE_TIMEOUT секунд.
+    """
+    def __init__(self, maxsize=SHORT_LINK_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._data = OrderedDict()
+
+    def get(self, code):
+        with self._lock:
+            entry = self._data.get(code)
+            if entry is None:
+                return None
+            recipe_id, expires = entry
+            if expires <= time.monotonic():
+                del self._data[code]
+                return None
+            self._data.move_to_end(code)
+            return recipe_id
+
+    def set(self, code, recipe_id):
+        expires = time.monotonic() + settings.SHORT_LINK_CACHE_TIMEOUT
+        with self._lock:
+            self._data[code] = (recipe_id, expires)
+            self._data.move_to_end(code)
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def evict(self, code):
+        with self._lock:
+            self._data.pop(code, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+short_link_cache = ShortLinkCache()
+
+
+def find_recipe_id(code):
+    """
+    Id рецепта по коду короткой ссылки или None.
+    """
+    return ShortLink.objects.filter(code=code).values_list(
+        'recipe_id', flat=True
+    ).first()
@@ -0,0 +1,196 @@
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_init,
+    post_save,
+    pre_save,
+)
+from django.dispatch import receiver
+
+from api.images import schedule_image_processing, strip_metadata
+from api.mixins import RECIPE_COUNTERS
+from api.reference import ingredient_cache, tag_cache
+from api.response_cache import invalidate_fragments, invalidate_responses
+from api.short_links import short_link_cache
+from recipes.models import (
+    Favorite,
+    Ingredient,
+    Recipe,
+    ShoppingCart,
+    ShortLink,
+    Subscribe,
+    Tag,
+)
+from users.models import User
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def invalidate_ingredient_cache(**kwargs):
+    """
+    Сбрасывает кэш и индекс ингредиентов, фрагменты и ответы рецептов
+    при изменении справочника.
+    """
+    ingredient_cache.invalidate()
+    invalidate_fragments()
+    invalidate_responses()
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def invalidate_tag_cache(**kwargs):
+    """
+    Сбрасывает кэш тегов, фрагменты и ответы рецептов
+    при изменении справочника.
+    """
+    tag_cache.invalidate()
+    invalidate_fragments()
+    invalidate_responses()
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def invalidate_recipe_responses(**kwargs):
+    """
+    Сбрасывает кэш ответов рецептов при изменении рецепта или его тегов.
+    """
+    invalidate_responses()
+
+
+@receiver(post_delete, sender=ShortLink)
+def evict_short_link(instance, **kwargs):
+    """
+    Убирает код из кэша коротких ссылок, в том числе при каскадном
+    удалении вместе с рецептом.
+    """
+    short_link_cache.evict(instance.code)
+
+
+def change_counter(user_id, field, delta):
+    """
+    Меняет счетчик пользователя, не опуская его ниже нуля:
+    счетчик мог разойтись с данными, например после правок в базе.
+    """
+    User.objects.filter(pk=user_id).update(
+        **{field: Greatest(F(field) + delta, 0)}
+    )
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+def increment_recipe_counter(sender, instance, created, **kwargs):
+    """
+    Счетчики рецепта для записей в обход API (админка, shell).
+    API меняет списки сырым SQL без сигналов, двойного учета нет.
+    """
+    if created:
+        Recipe.objects.filter(pk=instance.recipe_id).update(
+            **{RECIPE_COUNTERS[sender]: F(RECIPE_COUNTERS[sender]) + 1}
+        )
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingCart)
+def decrement_recipe_counter(sender, instance, **kwargs):
+    """
+    Уменьшает счетчик рецепта, в том числе при каскадном удалении
+    вместе с пользователем.
+    """
+    field = RECIPE_COUNTERS[sender]
+    Recipe.objects.filter(pk=instance.recipe_id).update(
+        **{field: Greatest(F(field) - 1, 0)}
+    )
+
+
+@receiver(post_delete, sender=Recipe)
+def decrement_recipes_count(instance, **kwargs):
+    """
+    Уменьшает счетчик рецептов автора. Срабатывает и при удалении
+    через QuerySet.delete() (массовое удаление в админке).
+    """
+    change_counter(instance.author_id, 'recipes_count', -1)
+
+
+@receiver(post_save, sender=Subscribe)
+def increment_followers_count(instance, created, **kwargs):
+    if created:
+        change_counter(instance.subscribed_to_id, 'followers_count', 1)
+
+
+@receiver(post_delete, sender=Subscribe)
+def decrement_followers_count(instance, **kwargs):
+    change_counter(instance.subscribed_to_id, 'followers_count', -1)
+
+
+# Поля автора, которые попадают в закэшированные фрагменты рецептов
+AUTHOR_FIELDS = ('username', 'email', 'first_name', 'last_name', 'avatar')
+
+
+def field_value(instance, field):
+    """
+    Значение поля без обращения к базе; для файлов - имя файла.
+    """
+    value = instance.__dict__.get(field)
+    return getattr(value, 'name', value) or None
+
+
+# Поля изображений, которые раздаются публично из медиа
+IMAGE_FIELDS = {Recipe: 'image', User: 'avatar'}
+
+
+@receiver(pre_save, sender=Recipe)
+@receiver(pre_save, sender=User)
+def strip_image_metadata(sender, instance, **kwargs):
+    """
+    Удаляет метаданные из нового изображения до его записи
+    в хранилище: файл доступен по ссылке сразу после сохранения.
+    """
+    field = IMAGE_FIELDS[sender]
+    file = getattr(instance, field)
+    if file and not file._committed:
+        content = strip_metadata(file)
+        content.name = file.name
+        setattr(instance, field, content)
+
+
+@receiver(post_init, sender=Recipe)
+def remember_recipe_image(instance, **kwargs):
+    instance._saved_image = field_value(instance, 'image')
+
+
+@receiver(post_save, sender=Recipe)
+def process_recipe_image(instance, **kwargs):
+    """
+    Запускает фоновое создание копий картинки рецепта,
+    только если загружена новая картинка.
+    """
+    image = field_value(instance, 'image')
+    if image != instance._saved_image:
+        instance._saved_image = image
+        schedule_image_processing(instance.image)
+
+
+@receiver(post_init, sender=User)
+def remember_author_fields(instance, **kwargs):
+    instance._saved_author_fields = {
+        field: field_value(instance, field) for field in AUTHOR_FIELDS
+    }
+
+
+@receiver(post_save, sender=User)
+def invalidate_author_fragments(instance, created=False, **kwargs):
+    """
+    Сбрасывает закэшированные рецепты, если изменились данные автора.
+    Смена пароля, входы и регистрация кэш не трогают.
+    """
+    saved = instance._saved_author_fields
+    current = {
+        field: field_value(instance, field) for field in AUTHOR_FIELDS
+    }
+    instance._saved_author_fields = current
+    if not created and current != saved:
+        invalidate_fragments()
+        invalidate_responses()
@@ -1,14 +1,78 @@
+import base64
+import json
+import os
+import tempfile
+from concurrent.futures import Future
+from datetime import timedelta
 from http import HTTPStatus
+from io import BytesIO, StringIO
+from unittest import mock
 
+from django.core.asgi import get_asgi_application
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.signals import request_finished, request_started
+from django.db import close_old_connections
+from django.test import override_settings
+from django.utils import timezone
 from rest_framework.authtoken.models import Token
 from rest_framework.test import APIClient, APITestCase
 
-from recipes.models import Ingredient, Tag
+from api.fields import BASE64_CHUNK_SIZE, decode_base64_to_file
+from api.response_cache import fragment_generation, response_generation
+from api.short_links import short_link_cache
+from asgiref.sync import async_to_sync
+from PIL import Image
+from recipes.models import (
+    Favorite,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    ReferenceVersion,
+    ShoppingCart,
+    ShoppingCartExport,
+    Subscribe,
+    Tag,
+)
 from users.models import User
 
 
+PNG_IMAGE = (
+    'data:image/png;base64,'
+    'iVBORw0KGgoAAAANSUhEUgAAAAEAAAABAg'
+    'MAAABieywaAAAACVBMVEUAAAD///9fX1/'
+    'S0ecCAAAACXBIWXMAAA7EAAAOxAGVKw4bA'
+    'AAACklEQVQImWNoAAAAggCByxOyYQAAAAB'
+    'JRU5ErkJggg=='
+)
+
+
+def jpeg_with_exif():
+    """Картинка JPEG в base64 с производителем камеры в EXIF."""
+    exif = Image.Exif()
+    exif[0x010F] = 'Camera'
+    buffer = BytesIO()
+    Image.new('RGB', (8, 8)).save(buffer, format='JPEG', exif=exif)
+    return 'data:image/jpeg;base64,' + base64.b64encode(
+        buffer.getvalue()
+    ).decode()
+
+
+class SyncExecutor:
+    """Выполняет фоновые задачи сразу, в потоке теста."""
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        future.set_result(fn(*args, **kwargs))
+        return future
+
+
 class RecipesAPITestCase(APITestCase):
     def setUp(self):
+        cache.clear()
+        response_generation.reset()
+        fragment_generation.reset()
+        short_link_cache.clear()
         self.client = APIClient()
         self.user = User.objects.create_user(
             username='testuser', password='testpass'
@@ -69,3 +133,833 @@ class RecipesAPITestCase(APITestCase):
         self.client.force_authenticate(user=None)  # type: ignore
         response = self.client.get('/api/recipes/download_shopping_cart/')
         self.assertEqual(response.status_code, HTTPStatus.UNAUTHORIZED)
+
+    def test_list_is_favorited_flags(self):
+        """Проверка флагов избранного и корзины в списке рецептов."""
+        recipe = Recipe.objects.create(
+            author=self.user, name='Recipe', text='Text', cooking_time=5
+        )
+        Favorite.objects.create(user=self.user, recipe=recipe)
+        response = self.client.get('/api/recipes/')
+        result = response.data['results'][0]  # type: ignore
+        self.assertTrue(result['is_favorited'])
+        self.assertFalse(result['is_in_shopping_cart'])
+
+    def create_recipes(self, count):
+        for number in range(count):
+            recipe = Recipe.objects.create(
+                author=self.user,
+                name=f'Recipe {number}',
+                text='Text',
+                cooking_time=5
+            )
+            recipe.tags.set([self.tag1, self.tag2])
+            RecipeIngredient.objects.bulk_create([
+                RecipeIngredient(
+                    recipe=recipe, ingredient=self.ingredient1, amount=1
+                ),
+                RecipeIngredient(
+                    recipe=recipe, ingredient=self.ingredient2, amount=2
+                ),
+            ])
+
+    def test_list_query_count(self):
+        """Число запросов списка рецептов не зависит от размера страницы."""
+        self.create_recipes(10)
+        # Работающий процесс уже знает поколения кэша
+        response_generation.get()
+        fragment_generation.get()
+        with self.assertNumQueries(6):
+            response = self.client.get('/api/recipes/?limit=2')
+        self.assertEqual(len(response.data['results']), 2)  # type: ignore
+        with self.assertNumQueries(6):
+            response = self.client.get('/api/recipes/?limit=10')
+        self.assertEqual(len(response.data['results']), 10)  # type: ignore
+
+    def test_subscriptions_recipes_limit(self):
+        """Проверка пагинации подписок и ограничения рецептов автора."""
+        author = User.objects.create_user(
+            username='author', email='author@test.ru', password='testpass'
+        )
+        for number in range(3):
+            Recipe.objects.create(
+                author=author,
+                name=f'Recipe {number}',
+                text='Text',
+                cooking_time=5
+            )
+        Subscribe.objects.create(subscriber=self.user, subscribed_to=author)
+        response = self.client.get(
+            '/api/users/subscriptions/?recipes_limit=2'
+        )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        result = response.data['results'][0]  # type: ignore
+        self.assertEqual(result['recipes_count'], 3)
+        self.assertEqual(len(result['recipes']), 2)
+        self.assertTrue(result['is_subscribed'])
+
+    def test_download_shopping_cart_formats(self):
+        """Проверка выгрузки списка покупок в разных форматах."""
+        self.create_recipes(2)
+        for recipe in Recipe.objects.all():
+            ShoppingCart.objects.create(user=self.user, recipe=recipe)
+        url = '/api/recipes/download_shopping_cart/'
+        response = self.client.get(url, {'format': 'txt'})
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        content = b''.join(response.streaming_content).decode()
+        self.assertIn('Ingredient 1 (g): 2', content)
+        response = self.client.get(url)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        response = self.client.get(url, {'format': 'xml'})
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+
+    def test_download_shopping_cart_async(self):
+        """Проверка фоновой выгрузки списка покупок."""
+        self.create_recipes(1)
+        ShoppingCart.objects.create(
+            user=self.user, recipe=Recipe.objects.get()
+        )
+        url = '/api/recipes/download_shopping_cart/'
+        with tempfile.TemporaryDirectory() as media_root, \
+                override_settings(MEDIA_ROOT=media_root):
+            # Соединение теста живет в транзакции, его нельзя закрывать
+            with mock.patch('api.jobs.get_executor', SyncExecutor), \
+                    mock.patch('api.jobs.connection'), \
+                    self.captureOnCommitCallbacks(execute=True):
+                response = self.client.get(url, {'mode': 'async'})
+            self.assertEqual(response.status_code, HTTPStatus.ACCEPTED)
+            export_id = response.data['id']  # type: ignore
+            response = self.client.get(f'{url}{export_id}/')
+            self.assertEqual(response.status_code, HTTPStatus.OK)
+            data = response.data  # type: ignore
+            self.assertEqual(data['status'], ShoppingCartExport.DONE)
+            file_url = data['file']
+            self.assertTrue(file_url.startswith('http://testserver/media/'))
+            self.assertNotIn(f'_{export_id}.', file_url)
+            export = ShoppingCartExport.objects.get(id=export_id)
+            path = export.file.path
+            with open(path, 'rb') as file:
+                self.assertTrue(file.read().startswith(b'%PDF'))
+            ShoppingCartExport.objects.filter(id=export_id).update(
+                created=timezone.now() - timedelta(days=2)
+            )
+            call_command('cleanup_exports', stdout=StringIO())
+            self.assertFalse(
+                ShoppingCartExport.objects.filter(id=export_id).exists()
+            )
+            self.assertFalse(os.path.exists(path))
+
+    def test_download_shopping_cart_async_timeout(self):
+        """Зависшая фоновая выгрузка помечается неудачной."""
+        self.create_recipes(1)
+        ShoppingCart.objects.create(
+            user=self.user, recipe=Recipe.objects.get()
+        )
+        url = '/api/recipes/download_shopping_cart/'
+        with self.captureOnCommitCallbacks():
+            response = self.client.get(url, {'mode': 'async'})
+        export_id = response.data['id']  # type: ignore
+        response = self.client.get(f'{url}{export_id}/')
+        self.assertEqual(
+            response.data['status'], ShoppingCartExport.PENDING  # type: ignore
+        )
+        ShoppingCartExport.objects.filter(id=export_id).update(
+            created=timezone.now() - timedelta(hours=1)
+        )
+        response = self.client.get(f'{url}{export_id}/')
+        self.assertEqual(
+            response.data['status'], ShoppingCartExport.FAILED  # type: ignore
+        )
+        self.assertIsNone(response.data['file'])  # type: ignore
+
+    def test_get_link_redirect(self):
+        """Проверка короткой ссылки на рецепт."""
+        self.create_recipes(1)
+        recipe = Recipe.objects.get()
+        url = f'/api/recipes/{recipe.id}/get-link/'
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        short_link = response.data['short-link']  # type: ignore
+        response = self.client.get(url)
+        self.assertEqual(
+            response.data['short-link'], short_link  # type: ignore
+        )
+        response = self.client.get(short_link)
+        self.assertRedirects(
+            response,
+            f'/recipes/{recipe.id}/',
+            fetch_redirect_response=False
+        )
+        # Повторный переход - из кэша, без обращения к базе
+        with mock.patch('api.views.find_recipe_id') as find_recipe_id:
+            response = self.client.get(short_link)
+        find_recipe_id.assert_not_called()
+        self.assertEqual(response['Location'], f'/recipes/{recipe.id}/')
+        response = self.client.get('/s/unknown/')
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+        recipe.delete()
+        response = self.client.get(short_link)
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+    @override_settings(SHORT_LINK_CACHE_TIMEOUT=0)
+    def test_short_link_cache_timeout(self):
+        """Код короткой ссылки вытесняется из кэша по времени."""
+        short_link_cache.set('code', 1)
+        self.assertIsNone(short_link_cache.get('code'))
+
+    def test_ingredient_autocomplete(self):
+        """Проверка ранжирования поиска ингредиентов."""
+        Ingredient.objects.create(name='Соль морская', measurement_unit='г')
+        Ingredient.objects.create(name='Морская соль', measurement_unit='г')
+        response = self.client.get('/api/ingredients/', {'name': 'соль'})
+        names = [item['name'] for item in response.data]  # type: ignore
+        self.assertEqual(names, ['Соль морская', 'Морская соль'])
+        response = self.client.get(
+            '/api/ingredients/', {'name': 'соль', 'limit': 1},
+            HTTP_IF_NONE_MATCH=response['ETag']
+        )
+        self.assertEqual(len(response.data), 1)  # type: ignore
+        etag = response['ETag']
+        response = self.client.get(
+            '/api/ingredients/', {'name': 'соль', 'limit': 1},
+            HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+
+    def test_reference_cache_invalidation(self):
+        """Проверка кэша справочника тегов и его сброса."""
+        response = self.client.get('/api/tags/')
+        self.assertEqual(len(response.json()), 2)
+        response = self.client.get(
+            '/api/tags/', HTTP_IF_NONE_MATCH=response['ETag']
+        )
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+        Tag.objects.create(name='Tag 3', color='#3357FF', slug='tag-3')
+        response = self.client.get('/api/tags/')
+        self.assertEqual(len(response.json()), 3)
+
+    @override_settings(REFERENCE_CACHE_CHECK_INTERVAL=0)
+    def test_reference_cache_version_from_database(self):
+        """Сброс кэша справочника из другого процесса виден через базу."""
+        self.assertEqual(len(self.client.get('/api/tags/').json()), 2)
+        # Другой процесс (management-команда) меняет данные и версию
+        Tag.objects.bulk_create([
+            Tag(name='Tag 3', color='#3357FF', slug='tag-3')
+        ])
+        self.assertEqual(len(self.client.get('/api/tags/').json()), 2)
+        ReferenceVersion.objects.filter(name='recipes.tag').update(
+            updated=timezone.now() + timedelta(seconds=1)
+        )
+        self.assertEqual(len(self.client.get('/api/tags/').json()), 3)
+
+    def test_recipe_search(self):
+        """Проверка полнотекстового поиска рецептов."""
+        Recipe.objects.create(
+            author=self.user, name='Суп', text='Борщ с томатами',
+            cooking_time=5
+        )
+        Recipe.objects.create(
+            author=self.user, name='Борщ', text='Свекла', cooking_time=5
+        )
+        Recipe.objects.create(
+            author=self.user, name='Каша', text='Гречка', cooking_time=5
+        )
+        response = self.client.get('/api/recipes/', {'search': 'борщи'})
+        names = [
+            item['name'] for item in response.data['results']  # type: ignore
+        ]
+        self.assertEqual(names, ['Борщ', 'Суп'])
+        # Одинаковая популярность, суп новее: решает релевантность
+        Recipe.objects.update(favorite_count=1)
+        Recipe.objects.filter(name='Суп').update(
+            pub_date=timezone.now() + timedelta(days=1)
+        )
+        response = self.client.get(
+            '/api/recipes/', {'search': 'борщи', 'ordering': 'popular'}
+        )
+        names = [
+            item['name'] for item in response.data['results']  # type: ignore
+        ]
+        self.assertEqual(names, ['Борщ', 'Суп'])
+
+    def test_list_cursor_pagination(self):
+        """Проверка курсорной пагинации ленты рецептов."""
+        self.create_recipes(3)
+        response = self.client.get(
+            '/api/recipes/', {'pagination': 'cursor', 'limit': 2}
+        )
+        self.assertNotIn('count', response.data)
+        self.assertEqual(len(response.data['results']), 2)  # type: ignore
+        response = self.client.get(response.data['next'])  # type: ignore
+        self.assertEqual(len(response.data['results']), 1)  # type: ignore
+        self.assertIsNone(response.data['next'])  # type: ignore
+        response = self.client.get(
+            '/api/recipes/', {'pagination': 'cursor', 'ordering': 'popular'}
+        )
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+        self.assertIn('ordering', response.data)
+        response = self.client.get(
+            '/api/recipes/', {'cursor': 'abc', 'search': 'recipe'}
+        )
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+        self.assertIn('search', response.data)
+
+    def test_favorite_counter(self):
+        """Проверка счетчиков избранного и рецептов автора."""
+        self.create_recipes(1)
+        recipe = Recipe.objects.get()
+        url = f'/api/recipes/{recipe.id}/favorite/'
+        self.client.post(url)
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.favorite_count, 1)
+        self.client.delete(url)
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.favorite_count, 0)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.recipes_count, 1)
+
+    def test_user_counters_admin_paths(self):
+        """Счетчики пользователя при записях в обход API."""
+        author = User.objects.create_user(
+            username='author', email='author@example.com', password='pass'
+        )
+        Subscribe.objects.create(subscriber=self.user, subscribed_to=author)
+        author.refresh_from_db()
+        self.assertEqual(author.followers_count, 1)
+        User.objects.filter(pk=author.pk).update(followers_count=0)
+        response = self.client.delete(f'/api/users/{author.id}/subscribe/')
+        self.assertEqual(response.status_code, HTTPStatus.NO_CONTENT)
+        author.refresh_from_db()
+        self.assertEqual(author.followers_count, 0)
+        self.create_recipes(3)
+        Recipe.objects.filter(name__in=['Recipe 0', 'Recipe 1']).delete()
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.recipes_count, 1)
+
+    def test_recipe_counters_admin_paths(self):
+        """Счетчики рецепта при записях в обход API и каскадном удалении."""
+        self.create_recipes(1)
+        recipe = Recipe.objects.get()
+        other = User.objects.create_user(
+            username='other', email='other@example.com', password='pass'
+        )
+        client = APIClient()
+        client.force_authenticate(other)
+        client.post(f'/api/recipes/{recipe.id}/favorite/')
+        client.post(f'/api/recipes/{recipe.id}/shopping_cart/')
+        Favorite.objects.create(user=self.user, recipe=recipe)
+        ShoppingCart.objects.create(user=self.user, recipe=recipe)
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.favorite_count, 2)
+        self.assertEqual(recipe.shopping_cart_count, 2)
+        other.delete()
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.favorite_count, 1)
+        self.assertEqual(recipe.shopping_cart_count, 1)
+        Favorite.objects.filter(user=self.user).delete()
+        ShoppingCart.objects.get(user=self.user).delete()
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.favorite_count, 0)
+        self.assertEqual(recipe.shopping_cart_count, 0)
+
+    def test_remove_favorite_with_drifted_counter(self):
+        """Удаление из избранного при счетчике, разошедшемся со списком."""
+        self.create_recipes(1)
+        recipe = Recipe.objects.get()
+        Favorite.objects.create(user=self.user, recipe=recipe)
+        response = self.client.delete(f'/api/recipes/{recipe.id}/favorite/')
+        self.assertEqual(response.status_code, HTTPStatus.NO_CONTENT)
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.favorite_count, 0)
+
+    def test_shopping_cart_toggle_idempotent(self):
+        """Повторные запросы к корзине не ломают счетчик."""
+        self.create_recipes(1)
+        recipe = Recipe.objects.get()
+        url = f'/api/recipes/{recipe.id}/shopping_cart/'
+        with self.assertNumQueries(2):
+            response = self.client.post(url)
+        self.assertEqual(response.status_code, HTTPStatus.CREATED)
+        self.assertEqual(response.data['name'], recipe.name)  # type: ignore
+        response = self.client.post(url)
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.shopping_cart_count, 1)
+        with self.assertNumQueries(2):
+            response = self.client.delete(url)
+        self.assertEqual(response.status_code, HTTPStatus.NO_CONTENT)
+        response = self.client.delete(url)
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.shopping_cart_count, 0)
+        response = self.client.post('/api/recipes/999999/shopping_cart/')
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+    def test_shopping_cart_batch(self):
+        """Проверка пакетного добавления, удаления и очистки корзины."""
+        self.create_recipes(3)
+        first, second, third = Recipe.objects.order_by('id')
+        url = '/api/recipes/shopping_cart/batch/'
+        self.client.post(f'/api/recipes/{first.id}/shopping_cart/')
+        response = self.client.post(url, {
+            'recipes': [first.id, second.id, third.id, 999999]
+        }, format='json')
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(
+            [item['status'] for item in response.data['results']],
+            ['already_added', 'added', 'added', 'not_found']
+        )
+        response = self.client.delete(
+            url, {'recipes': [second.id]}, format='json'
+        )
+        self.assertEqual(
+            response.data['results'], [{'id': second.id, 'status': 'removed'}]
+        )
+        second.refresh_from_db()
+        self.assertEqual(second.shopping_cart_count, 0)
+        response = self.client.delete('/api/recipes/shopping_cart/')
+        self.assertEqual(
+            [item['id'] for item in response.data['results']],
+            [first.id, third.id]
+        )
+        self.assertFalse(ShoppingCart.objects.exists())
+        self.assertFalse(
+            Recipe.objects.filter(shopping_cart_count__gt=0).exists()
+        )
+        response = self.client.post(url, {'recipes': []}, format='json')
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+
+    def test_list_trending_ordering(self):
+        """Проверка сортировки ленты по трендовому рейтингу."""
+        self.create_recipes(2)
+        recipe = Recipe.objects.get(name='Recipe 0')
+        Favorite.objects.create(user=self.user, recipe=recipe)
+        call_command('update_trending', stdout=StringIO())
+        response = self.client.get('/api/recipes/', {'ordering': 'trending'})
+        self.assertEqual(
+            response.data['results'][0]['id'], recipe.id  # type: ignore
+        )
+
+    def test_feed(self):
+        """Проверка ленты рецептов подписок."""
+        author = User.objects.create_user(
+            username='author', email='author@test.ru', password='testpass'
+        )
+        recipe = Recipe.objects.create(
+            author=author, name='Recipe', text='Text', cooking_time=5
+        )
+        self.create_recipes(1)
+        Subscribe.objects.create(subscriber=self.user, subscribed_to=author)
+        response = self.client.get('/api/recipes/feed/')
+        results = response.data['results']  # type: ignore
+        self.assertEqual([item['id'] for item in results], [recipe.id])
+        self.assertTrue(results[0]['author']['is_subscribed'])
+
+    @override_settings(MAX_IMAGE_UPLOAD_SIZE=16)
+    def test_image_size_limit(self):
+        """Проверка ограничения размера загружаемого изображения."""
+        response = self.client.put(
+            '/api/users/me/avatar/',
+            {'avatar': 'data:image/png;base64,' + 'A' * 64},
+            format='json'
+        )
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+
+    def test_image_line_wrapped_base64(self):
+        """Base64 с переносами строк декодируется как и без них."""
+        image = BytesIO()
+        Image.effect_noise((300, 300), 100).save(image, format='PNG')
+        encoded = base64.encodebytes(image.getvalue()).decode()
+        self.assertGreater(len(encoded), BASE64_CHUNK_SIZE)
+        file = decode_base64_to_file(
+            'data:image/png;base64,' + encoded,
+            len('data:image/png;base64,'),
+            len(image.getvalue())
+        )
+        self.assertEqual(file.read(), image.getvalue())
+
+    @override_settings(DATA_UPLOAD_MAX_MEMORY_SIZE=50)
+    def test_json_body_size_limit(self):
+        """JSON больше DATA_UPLOAD_MAX_MEMORY_SIZE отклоняется с 413."""
+        response = self.client.put(
+            '/api/users/me/avatar/',
+            {'avatar': 'data:image/png;base64,' + 'A' * 5000},
+            format='json'
+        )
+        self.assertEqual(
+            response.status_code, HTTPStatus.REQUEST_ENTITY_TOO_LARGE
+        )
+
+    def test_user_save_without_avatar_change(self):
+        """Смена пароля и регистрация не обрабатывают аватар и кэш."""
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.user.set_password('newpass')
+            self.user.save()
+            User.objects.create_user(
+                username='new', email='new@example.com', password='pass'
+            )
+        self.assertEqual(callbacks, [])
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.user.first_name = 'Changed'
+            self.user.save()
+        self.assertEqual(len(callbacks), 2)
+        with tempfile.TemporaryDirectory() as media_root:
+            with override_settings(MEDIA_ROOT=media_root):
+                with self.captureOnCommitCallbacks() as callbacks:
+                    response = self.client.put(
+                        '/api/users/me/avatar/',
+                        {'avatar': PNG_IMAGE},
+                        format='json'
+                    )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        # Только сброс кэша: метаданные аватара удалены при загрузке
+        self.assertEqual(len(callbacks), 2)
+
+    def test_image_metadata_stripped_on_upload(self):
+        """EXIF удаляется до записи файла и из ранее сохраненных файлов."""
+        with tempfile.TemporaryDirectory() as media_root, \
+                override_settings(MEDIA_ROOT=media_root):
+            with self.captureOnCommitCallbacks():
+                response = self.client.put(
+                    '/api/users/me/avatar/',
+                    {'avatar': jpeg_with_exif()},
+                    format='json'
+                )
+            self.assertEqual(response.status_code, HTTPStatus.OK)
+            self.user.refresh_from_db()
+            with Image.open(self.user.avatar.path) as image:
+                self.assertEqual(dict(image.getexif()), {})
+            # Файл из хранилища в обход модели, как до очистки при загрузке
+            self.user.avatar.save(
+                'old.jpg',
+                SimpleUploadedFile('old.jpg', base64.b64decode(
+                    jpeg_with_exif().split(',')[1]
+                )),
+                save=False
+            )
+            old_name = self.user.avatar.name
+            User.objects.filter(pk=self.user.pk).update(avatar=old_name)
+            with Image.open(self.user.avatar.path) as image:
+                self.assertNotEqual(dict(image.getexif()), {})
+            call_command(
+                'backfill_renditions', strip_metadata=True, stdout=StringIO()
+            )
+            self.user.refresh_from_db()
+            self.assertNotEqual(self.user.avatar.name, old_name)
+            with Image.open(self.user.avatar.path) as image:
+                self.assertEqual(dict(image.getexif()), {})
+            self.assertFalse(
+                os.path.exists(os.path.join(media_root, old_name))
+            )
+
+    def test_image_magic_bytes(self):
+        """Проверка типа изображения по содержимому, а не по префиксу."""
+        response = self.client.put(
+            '/api/users/me/avatar/',
+            {'avatar': 'data:image/png;base64,' + 'QUJD' * 16},
+            format='json'
+        )
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+
+    def test_list_response_cache(self):
+        """Проверка кэша ответов списка рецептов."""
+        self.create_recipes(2)
+        recipe = Recipe.objects.first()
+        Favorite.objects.create(user=self.user, recipe=recipe)
+        self.client.get('/api/recipes/')
+        with self.assertNumQueries(4):
+            response = self.client.get('/api/recipes/')
+        favorited = {
+            item['id']: item['is_favorited']
+            for item in response.data['results']  # type: ignore
+        }
+        self.assertTrue(favorited[recipe.id])
+        self.client.force_authenticate(user=None)  # type: ignore
+        self.client.credentials()
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/recipes/')
+        self.assertFalse(any(
+            item['is_favorited']
+            for item in response.data['results']  # type: ignore
+        ))
+
+    @override_settings(REFERENCE_CACHE_CHECK_INTERVAL=0)
+    def test_response_cache_generation_from_database(self):
+        """Сброс кэша ответов из другого процесса виден через базу."""
+        self.create_recipes(1)
+        self.client.get('/api/recipes/')
+        # Другой процесс (update_trending по cron) меняет порядок ленты
+        Recipe.objects.update(name='Changed', updated=timezone.now())
+        response = self.client.get('/api/recipes/')
+        self.assertEqual(
+            response.data['results'][0]['name'], 'Recipe 0'  # type: ignore
+        )
+        ReferenceVersion.objects.filter(name='recipes:responses').update(
+            updated=timezone.now() + timedelta(seconds=1)
+        )
+        response = self.client.get('/api/recipes/')
+        self.assertEqual(
+            response.data['results'][0]['name'], 'Changed'  # type: ignore
+        )
+
+    def test_list_fragment_cache(self):
+        """Проверка кэша фрагментов рецептов."""
+        self.create_recipes(3)
+        self.client.get('/api/recipes/', {'limit': 10})
+        with self.assertNumQueries(4):
+            self.client.get('/api/recipes/', {'limit': 11})
+        recipe = Recipe.objects.first()
+        recipe.name = 'Changed'
+        recipe.save()
+        with self.assertNumQueries(6):
+            response = self.client.get('/api/recipes/', {'limit': 12})
+        names = [
+            item['name'] for item in response.data['results']  # type: ignore
+        ]
+        self.assertIn('Changed', names)
+
+    @override_settings(REFERENCE_CACHE_CHECK_INTERVAL=0)
+    def test_fragment_cache_generation_from_database(self):
+        """Сброс фрагментов из другого процесса виден через базу."""
+        self.create_recipes(1)
+        self.client.get('/api/recipes/', {'limit': 1})
+        # Другой воркер переименовал автора
+        User.objects.filter(pk=self.user.pk).update(first_name='Changed')
+        response = self.client.get('/api/recipes/', {'limit': 2})
+        author = response.data['results'][0]['author']  # type: ignore
+        self.assertNotEqual(author['first_name'], 'Changed')
+        ReferenceVersion.objects.filter(name='recipes:fragments').update(
+            updated=timezone.now() + timedelta(seconds=1)
+        )
+        response = self.client.get('/api/recipes/', {'limit': 3})
+        author = response.data['results'][0]['author']  # type: ignore
+        self.assertEqual(author['first_name'], 'Changed')
+
+    def test_benchmark(self):
+        """Проверка генерации данных и отчета бенчмарка."""
+        call_command(
+            'seed_benchmark_data', users=5, recipes=10, favorites=10,
+            carts=10, subscriptions=10, stdout=StringIO()
+        )
+        self.assertEqual(
+            Recipe.objects.filter(author__username__startswith='bench_')
+            .count(), 10
+        )
+        output = StringIO()
+        call_command('benchmark', repeat=1, search='Ingr', stdout=output)
+        report = json.loads(output.getvalue())
+        self.assertEqual(report['dataset']['ingredient_search'], 'Ingr')
+        for result in report['endpoints'].values():
+            self.assertEqual(result['status'], HTTPStatus.OK)
+            self.assertGreater(result['queries'], 0)
+
+    def test_seed_benchmark_data_deterministic(self):
+        """Одинаковый seed дает одинаковые данные."""
+        def seed():
+            call_command(
+                'seed_benchmark_data', users=5, recipes=10, favorites=10,
+                carts=10, subscriptions=10, stdout=StringIO()
+            )
+            return set(Favorite.objects.values_list(
+                'user__username', 'recipe__name'
+            )), set(RecipeIngredient.objects.filter(
+                recipe__author__username__startswith='bench_'
+            ).values_list('recipe__name', 'ingredient__name', 'amount'))
+
+        first = seed()
+        call_command('seed_benchmark_data', clear=True, stdout=StringIO())
+        self.assertEqual(seed(), first)
+
+    def test_update_recipe_ingredients_diff(self):
+        """Обновление рецепта меняет только изменившиеся строки."""
+        self.create_recipes(1)
+        recipe = Recipe.objects.get()
+        kept = RecipeIngredient.objects.get(ingredient=self.ingredient1)
+        ingredient3 = Ingredient.objects.create(
+            name='Ingredient 3', measurement_unit='kg'
+        )
+        response = self.client.patch(f'/api/recipes/{recipe.id}/', {
+            'ingredients': [
+                {'id': self.ingredient1.id, 'amount': 5},
+                {'id': ingredient3.id, 'amount': 7},
+            ],
+            'tags': [self.tag2.id],
+            'name': 'Updated',
+            'text': 'Text',
+            'cooking_time': 5,
+        }, format='json')
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(
+            RecipeIngredient.objects.get(pk=kept.pk).amount, 5
+        )
+        self.assertEqual(
+            dict(recipe.recipeingredient_set.values_list(
+                'ingredient_id', 'amount'
+            )),
+            {self.ingredient1.id: 5, ingredient3.id: 7}
+        )
+        self.assertEqual(list(recipe.tags.all()), [self.tag2])
+        self.assertEqual(
+            [tag['id'] for tag in response.data['tags']],  # type: ignore
+            [self.tag2.id]
+        )
+        self.assertEqual(
+            {
+                item['id']: item['amount']
+                for item in response.data['ingredients']  # type: ignore
+            },
+            {self.ingredient1.id: 5, ingredient3.id: 7}
+        )
+
+    def test_image_renditions_after_processing(self):
+        """Ссылки на копии картинки появляются только после их создания."""
+        data = {
+            'ingredients': [{'id': self.ingredient1.id, 'amount': 1}],
+            'tags': [self.tag1.id],
+            'image': PNG_IMAGE,
+            'name': 'Recipe',
+            'text': 'Text',
+            'cooking_time': 10,
+        }
+        with tempfile.TemporaryDirectory() as media_root:
+            with override_settings(MEDIA_ROOT=media_root):
+                response = self.client.post(
+                    '/api/recipes/', data, format='json'
+                )
+                self.assertIsNone(
+                    response.data['image_renditions']  # type: ignore
+                )
+                call_command('backfill_renditions', stdout=StringIO())
+                response = self.client.get(
+                    f'/api/recipes/{response.data["id"]}/'  # type: ignore
+                )
+        renditions = response.data['image_renditions']  # type: ignore
+        self.assertTrue(
+            renditions['card']['webp'].startswith('http://testserver/')
+        )
+
+    def test_create_recipe_missing_ids(self):
+        """Все несуществующие id ингредиентов и тэгов видны в ответе."""
+        data = {
+            'ingredients': [
+                {'id': self.ingredient1.id, 'amount': 100},
+                {'id': 998, 'amount': 1},
+                {'id': 999, 'amount': 1},
+            ],
+            'tags': [self.tag1.id, 997],
+            'image': PNG_IMAGE,
+            'name': 'Recipe',
+            'text': 'Text',
+            'cooking_time': 10,
+        }
+        response = self.client.post('/api/recipes/', data, format='json')
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+        self.assertIn('998, 999', str(response.data['ingredients']))
+        data['ingredients'] = data['ingredients'][:1]
+        response = self.client.post('/api/recipes/', data, format='json')
+        self.assertIn('997', str(response.data['tags']))
+        data['tags'] = [self.tag1.id, self.tag2.id]
+        with tempfile.TemporaryDirectory() as media_root:
+            with override_settings(MEDIA_ROOT=media_root):
+                response = self.client.post(
+                    '/api/recipes/', data, format='json'
+                )
+        self.assertEqual(response.status_code, HTTPStatus.CREATED)
+        self.assertEqual(
+            response.data['ingredients'][0]['name'],  # type: ignore
+            self.ingredient1.name
+        )
+        self.assertEqual(len(response.data['tags']), 2)  # type: ignore
+        self.assertFalse(response.data['is_favorited'])  # type: ignore
+
+    def test_recipes_import_export(self):
+        """Проверка импорта и выгрузки рецептов в JSON Lines."""
+        lines = [
+            {
+                'name': 'Imported',
+                'text': 'Text',
+                'cooking_time': 15,
+                'tags': [self.tag1.slug],
+                'ingredients': [
+                    {'name': 'ingredient 1', 'amount': 3},
+                    {
+                        'name': 'Ingredient 2',
+                        'measurement_unit': 'ml',
+                        'amount': 4,
+                    },
+                ],
+            },
+            {'name': 'Broken', 'tags': ['unknown']},
+            {
+                'name': 'Local file',
+                'text': 'Text',
+                'cooking_time': 5,
+                'tags': [self.tag2.slug],
+                'ingredients': [{'name': 'Ingredient 1', 'amount': 1}],
+                'image': '/etc/passwd',
+            },
+        ]
+        content = '\n'.join(
+            json.dumps(line, ensure_ascii=False) for line in lines
+        )
+        upload = SimpleUploadedFile('recipes.jsonl', content.encode())
+        response = self.client.post('/api/recipes/import/', {'file': upload})
+        self.assertEqual(response.status_code, HTTPStatus.FORBIDDEN)
+
+        self.user.is_staff = True
+        self.user.save()
+        upload.seek(0)
+        response = self.client.post('/api/recipes/import/', {'file': upload})
+        self.assertEqual(response.status_code, HTTPStatus.CREATED)
+        self.assertEqual(response.data['created'], 1)  # type: ignore
+        errors = response.data['errors']  # type: ignore
+        self.assertEqual([error['line'] for error in errors], [2, 3])
+        recipe = Recipe.objects.get(name='Imported')
+        self.assertEqual(list(recipe.tags.all()), [self.tag1])
+        self.assertEqual(recipe.recipeingredient_set.count(), 2)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.recipes_count, 1)
+
+        response = self.client.get('/api/recipes/export/')
+        records = [
+            json.loads(line)
+            for line in b''.join(response.streaming_content).splitlines()
+        ]
+        self.assertEqual(len(records), 1)
+        self.assertEqual(records[0]['author'], self.user.username)
+        self.assertEqual(len(records[0]['ingredients']), 2)
+
+    def test_recipes_export_asgi(self):
+        """Выгрузка рецептов работает через ASGI-приложение."""
+        self.create_recipes(2)
+        self.user.is_staff = True
+        self.user.save()
+        messages = []
+        scope = {
+            'type': 'http',
+            'method': 'GET',
+            'path': '/api/recipes/export/',
+            'query_string': b'',
+            'headers': [
+                (b'host', b'testserver'),
+                (b'authorization', f'Token {self.token.key}'.encode()),
+            ],
+        }
+
+        async def receive():
+            return {'type': 'http.request', 'body': b''}
+
+        async def send(message):
+            messages.append(message)
+
+        # Как и тестовый клиент, не даем обработчику закрыть соединение
+        request_started.disconnect(close_old_connections)
+        request_finished.disconnect(close_old_connections)
+        try:
+            async_to_sync(get_asgi_application())(scope, receive, send)
+        finally:
+            request_started.connect(close_old_connections)
+            request_finished.connect(close_old_connections)
+        self.assertEqual(messages[0]['status'], HTTPStatus.OK)
+        body = b''.join(message.get('body', b'') for message in messages[1:])
+        self.assertEqual(len(body.splitlines()), 2)
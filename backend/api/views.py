@@ -1,5 +1,17 @@
-from django.db.models import Sum
-from django.shortcuts import get_object_or_404
+import hashlib
+
+from django.db import transaction
+from django.db.models import (
+    Exists,
+    OuterRef,
+    Prefetch,
+    Subquery,
+    Value,
+    prefetch_related_objects,
+)
+from django.http import Http404
+from django.shortcuts import get_object_or_404, redirect
+from django.utils.http import quote_etag
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
 from rest_framework import permissions, status, viewsets
@@ -10,28 +22,44 @@ from rest_framework.permissions import (
 )
 from rest_framework.response import Response
 
-import pyshorteners
-from api.create_pdf import generate_shopping_cart_pdf
-from api.filters import IngredientFilter, RecipeFilter
-from api.mixins import ManageListMixin
-from api.pagination import RecipePagination
+from api.autocomplete import ingredient_index
+from api.catalogue import RecipeImporter, recipes_export_response
+from api.export import (
+    EXPORT_FORMATS,
+    IgnoreFormatNegotiation,
+    shopping_cart_ingredients,
+    shopping_cart_response,
+)
+from api.filters import RecipeFilter
+from api.jobs import expire_export, start_export
+from api.mixins import (
+    CachedRecipeResponseMixin,
+    CachedReferenceMixin,
+    ManageListMixin,
+)
+from api.pagination import RecipeCursorPagination, RecipePagination
 from api.permissions import AuthorOrReadOnly
+from api.reference import ingredient_cache, tag_cache
 from api.serializers import (
+    RECIPE_PREFETCHES,
     CustomUserSerializer,
     FavoriteRecipeSerializer,
     IngredientSerializer,
     RecipeCreateSerializer,
-    RecipeIngredient,
     RecipeSerializer,
     RecipeSubscriptionSerializer,
     SubscribeSerializer,
     TagSerializer,
 )
+from api.short_links import find_recipe_id, short_link_cache
+from asgiref.sync import sync_to_async
 from recipes.models import (
     Favorite,
     Ingredient,
     Recipe,
     ShoppingCart,
+    ShoppingCartExport,
+    ShortLink,
     Subscribe,
     Tag,
 )
@@ -58,18 +86,39 @@ class UsersViewSet(UserViewSet):
         """
         Функция для эндпоинта /api/users/subscriptions/
         """
-        user = request.user
         user_subscriptions = User.objects.filter(
-            subscribed_to__subscriber=user
-        )
+            subscribed_to__subscriber=request.user
+        ).annotate(is_subscribed=Value(True))
+        page = self.paginate_queryset(user_subscriptions)
+        authors = page if page is not None else list(user_subscriptions)
+        prefetch_related_objects(authors, Prefetch(
+            'recipe_set',
+            queryset=self.get_limited_recipes(request),
+            to_attr='limited_recipes'
+        ))
         serializer = SubscribeSerializer(
-            user_subscriptions, many=True, context={'request': request}
+            authors, many=True, context={'request': request}
         )
-        page = self.paginate_queryset(serializer.data)
         if page is not None:
-            return self.get_paginated_response(page)
+            return self.get_paginated_response(serializer.data)
         return Response(serializer.data)
 
+    @staticmethod
+    def get_limited_recipes(request):
+        """
+        Рецепты авторов, ограниченные параметром recipes_limit.
+        Ограничение применяется к каждому автору внутри одного запроса.
+        """
+        recipes = Recipe.objects.order_by('-pub_date')
+        recipes_limit = request.query_params.get('recipes_limit')
+        if recipes_limit is not None and recipes_limit.isdigit():
+            recipes = recipes.filter(pk__in=Subquery(
+                Recipe.objects.filter(
+                    author=OuterRef('author')
+                ).order_by('-pub_date').values('pk')[:int(recipes_limit)]
+            ))
+        return recipes
+
     @action(detail=True,
             methods=['post', 'delete'],
             permission_classes=(permissions.IsAuthenticated,),
@@ -87,10 +136,12 @@ class UsersViewSet(UserViewSet):
                     status=status.HTTP_400_BAD_REQUEST
                 )
 
-            subscription, created = Subscribe.objects.get_or_create(
-                subscriber=request.user,
-                subscribed_to=subscribed_to
-            )
+            # Счетчик подписчиков обновляется сигналами api.signals
+            with transaction.atomic():
+                subscription, created = Subscribe.objects.get_or_create(
+                    subscriber=request.user,
+                    subscribed_to=subscribed_to
+                )
             if not created:
                 return Response(
                     {'error': 'У вас уже есть подписка на этого пользователя'},
@@ -106,7 +157,8 @@ class UsersViewSet(UserViewSet):
                 subscriber=request.user,
                 subscribed_to=subscribed_to
             )
-            subscription.delete()
+            with transaction.atomic():
+                subscription.delete()
             return Response(status=status.HTTP_204_NO_CONTENT)
         except Subscribe.DoesNotExist:
             return Response(
@@ -141,7 +193,7 @@ class UsersViewSet(UserViewSet):
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
-class TagViewSet(viewsets.ModelViewSet):
+class TagViewSet(CachedReferenceMixin, viewsets.ModelViewSet):
     """
     ViewSet для эндпоинта /api/tags/
     """
@@ -149,9 +201,10 @@ class TagViewSet(viewsets.ModelViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     pagination_class = None
+    reference_cache = tag_cache
 
 
-class IngredientViewSet(viewsets.ModelViewSet):
+class IngredientViewSet(CachedReferenceMixin, viewsets.ModelViewSet):
     """
     ViewSet для эндпоинта /api/ingredients/
     """
@@ -159,11 +212,31 @@ class IngredientViewSet(viewsets.ModelViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     pagination_class = None
-    filter_backends = (DjangoFilterBackend,)
-    filterset_class = IngredientFilter
+    reference_cache = ingredient_cache
+
+    def list(self, request, *args, **kwargs):
+        """
+        Поиск по ?name= идет по индексу в памяти: сначала совпадения
+        по началу названия, затем по подстроке. ?limit= ограничивает
+        выдачу.
+        """
+        name = request.query_params.get('name')
+        if not name:
+            return super().list(request, *args, **kwargs)
+        limit = request.query_params.get('limit')
+        limit = int(limit) if limit and limit.isdigit() else None
+        version, ingredients = ingredient_index.search(name, limit)
+        response = Response(ingredients)
+        response['ETag'] = quote_etag(hashlib.md5(
+            f'{version}:{name.lower()}:{limit}'.encode(),
+            usedforsecurity=False
+        ).hexdigest())
+        return response
 
 
-class RecipeViewSet(viewsets.ModelViewSet, ManageListMixin):
+class RecipeViewSet(
+    CachedRecipeResponseMixin, viewsets.ModelViewSet, ManageListMixin
+):
     """
     ViewSet для эндпоинта /api/recipes/
     """
@@ -173,6 +246,62 @@ class RecipeViewSet(viewsets.ModelViewSet, ManageListMixin):
     permission_classes = [IsAuthenticatedOrReadOnly]
     pagination_class = RecipePagination
 
+    def get_queryset(self):
+        """
+        Подгружает связанные данные фиксированным числом запросов
+        и аннотирует флаги избранного, корзины и подписки на автора
+        для текущего пользователя.
+        """
+        queryset = super().get_queryset()
+        user = self.request.user
+        if user.is_authenticated:
+            authors = User.objects.annotate(
+                is_subscribed=Exists(Subscribe.objects.filter(
+                    subscriber=user, subscribed_to=OuterRef('pk')
+                ))
+            )
+            queryset = queryset.annotate(
+                is_favorited=Exists(Favorite.objects.filter(
+                    user=user, recipe=OuterRef('pk')
+                )),
+                is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                    user=user, recipe=OuterRef('pk')
+                )),
+            )
+        else:
+            authors = User.objects.annotate(is_subscribed=Value(False))
+            queryset = queryset.annotate(
+                is_favorited=Value(False),
+                is_in_shopping_cart=Value(False),
+            )
+        queryset = queryset.prefetch_related(
+            Prefetch('author', queryset=authors)
+        )
+        if self.action in ('list', 'feed'):
+            # Списки догружают связи только для рецептов,
+            # которых нет в кэше фрагментов (RecipeListSerializer).
+            return queryset
+        return queryset.prefetch_related(*RECIPE_PREFETCHES)
+
+    @property
+    def paginator(self):
+        """
+        Курсорная пагинация включается параметром ?pagination=cursor
+        или наличием ?cursor=, иначе используется постраничная.
+        Лента подписок всегда курсорная.
+        """
+        if not hasattr(self, '_paginator'):
+            params = self.request.query_params
+            if (
+                self.action == 'feed'
+                or params.get('pagination') == 'cursor'
+                or 'cursor' in params
+            ):
+                self._paginator = RecipeCursorPagination()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
+
     def get_serializer_class(self):
         if self.action in ('create', 'update', 'partial_update'):
             return RecipeCreateSerializer
@@ -183,16 +312,46 @@ class RecipeViewSet(viewsets.ModelViewSet, ManageListMixin):
             self.permission_classes = (AuthorOrReadOnly,)
         return super().get_permissions()
 
+    @action(detail=False,
+            methods=['get'],
+            permission_classes=(permissions.IsAuthenticated,),
+            url_path='feed',
+            )
+    def feed(self, request):
+        """
+        Функция для эндпоинта /api/recipes/feed/.
+        Лента рецептов авторов, на которых подписан пользователь,
+        по убыванию даты публикации.
+        """
+        queryset = self.get_queryset().filter(
+            author__in=Subscribe.objects.filter(
+                subscriber=request.user
+            ).values('subscribed_to')
+        )
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
     @action(detail=False,
             methods=['get'],
             permission_classes=(permissions.IsAuthenticated,),
             url_path='download_shopping_cart',
+            content_negotiation_class=IgnoreFormatNegotiation,
             )
     def download_shopping_cart(self, request):
         """
         Функция для эндпоинта /api/recipes/download_shopping_cart/.
-        Создает файл PDF со всеми ингредиентами добавленными в список покупок.
+        Выгружает все ингредиенты из списка покупок в формате
+        ?format= (pdf, txt или csv, по умолчанию pdf).
+        С ?mode=async ставит выгрузку в фоновую очередь и возвращает 202.
         """
+        export_format = request.query_params.get('format', 'pdf')
+        if export_format not in EXPORT_FORMATS:
+            return Response(
+                {'error': 'Неподдерживаемый формат выгрузки'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
         user = request.user
         shopping_cart_recipes = Recipe.objects.filter(shopping_cart__user=user)
 
@@ -202,14 +361,77 @@ class RecipeViewSet(viewsets.ModelViewSet, ManageListMixin):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        ingredients = RecipeIngredient.objects.filter(
-            recipe__in=shopping_cart_recipes
-        ).values(
-            'ingredient__name',
-            'ingredient__measurement_unit'
-        ).annotate(total_amount=Sum('amount'))
+        if request.query_params.get('mode') == 'async':
+            export = start_export(user, export_format)
+            return Response(
+                {'id': export.id, 'status': export.status},
+                status=status.HTTP_202_ACCEPTED
+            )
+
+        ingredients = shopping_cart_ingredients(user)
+        return shopping_cart_response(ingredients, export_format)
+
+    @action(detail=False,
+            methods=['post'],
+            permission_classes=(permissions.IsAdminUser,),
+            url_path='import',
+            )
+    def import_recipes(self, request):
+        """
+        Функция для эндпоинта /api/recipes/import/.
+        Импортирует рецепты из файла JSON Lines в поле file.
+        Изображения указываются именами файлов в медиа-хранилище.
+        """
+        file = request.FILES.get('file')
+        if file is None:
+            return Response(
+                {'error': 'Нужен файл JSON Lines в поле file'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        result = RecipeImporter(default_author=request.user).run(file)
+        return Response(
+            {'created': result.created, 'errors': result.errors},
+            status=(
+                status.HTTP_201_CREATED if result.created
+                else status.HTTP_400_BAD_REQUEST
+            )
+        )
+
+    @action(detail=False,
+            methods=['get'],
+            permission_classes=(permissions.IsAdminUser,),
+            url_path='export',
+            )
+    def export_recipes(self, request):
+        """
+        Функция для эндпоинта /api/recipes/export/.
+        Выгружает все рецепты потоком в формате JSON Lines.
+        """
+        return recipes_export_response()
 
-        return generate_shopping_cart_pdf(ingredients)
+    @action(detail=False,
+            methods=['get'],
+            permission_classes=(permissions.IsAuthenticated,),
+            url_path=r'download_shopping_cart/(?P<export_id>\d+)',
+            )
+    def shopping_cart_export(self, request, export_id=None):
+        """
+        Функция для эндпоинта
+        /api/recipes/download_shopping_cart/{export_id}/.
+        Возвращает статус фоновой выгрузки и ссылку на готовый файл.
+        """
+        export = expire_export(get_object_or_404(
+            ShoppingCartExport, id=export_id, user=request.user
+        ))
+        file_url = None
+        if export.status == ShoppingCartExport.DONE:
+            file_url = request.build_absolute_uri(export.file.url)
+        return Response({
+            'id': export.id,
+            'status': export.status,
+            'format': export.export_format,
+            'file': file_url,
+        })
 
     @action(detail=True,
             methods=['post', 'delete'],
@@ -243,6 +465,50 @@ class RecipeViewSet(viewsets.ModelViewSet, ManageListMixin):
                                     pk)
         return self.remove_from_list(request, ShoppingCart, pk)
 
+    @action(detail=False,
+            methods=['post', 'delete'],
+            permission_classes=(permissions.IsAuthenticated,),
+            url_path='favorite/batch')
+    def favorite_batch(self, request):
+        """
+        Функция для эндпоинта /api/recipes/favorite/batch/.
+        Добавляет или удаляет рецепты {"recipes": [id, ...]}.
+        """
+        return self.batch_list(request, Favorite)
+
+    @action(detail=False,
+            methods=['delete'],
+            permission_classes=(permissions.IsAuthenticated,),
+            url_path='favorite')
+    def favorite_clear(self, request):
+        """
+        Функция для эндпоинта /api/recipes/favorite/.
+        Очищает избранное.
+        """
+        return self.clear_list(request, Favorite)
+
+    @action(detail=False,
+            methods=['post', 'delete'],
+            permission_classes=(permissions.IsAuthenticated,),
+            url_path='shopping_cart/batch')
+    def shopping_cart_batch(self, request):
+        """
+        Функция для эндпоинта /api/recipes/shopping_cart/batch/.
+        Добавляет или удаляет рецепты {"recipes": [id, ...]}.
+        """
+        return self.batch_list(request, ShoppingCart)
+
+    @action(detail=False,
+            methods=['delete'],
+            permission_classes=(permissions.IsAuthenticated,),
+            url_path='shopping_cart')
+    def shopping_cart_clear(self, request):
+        """
+        Функция для эндпоинта /api/recipes/shopping_cart/.
+        Очищает список покупок.
+        """
+        return self.clear_list(request, ShoppingCart)
+
     @action(detail=True,
             methods=['get'],
             url_path='get-link',
@@ -252,13 +518,35 @@ class RecipeViewSet(viewsets.ModelViewSet, ManageListMixin):
         Функция для эндпоинта /api/recipes/{id}/get-link/
         """
         try:
-            _ = Recipe.objects.get(id=pk)
+            recipe = Recipe.objects.get(id=pk)
         except Recipe.DoesNotExist:
             return Response(
                 {'error': 'Несуществующий рецепт'},
                 status=status.HTTP_404_NOT_FOUND
             )
-        original_link = request.build_absolute_uri(f'/recipes/{pk}/')
-        s = pyshorteners.Shortener()
-        short_link = s.tinyurl.short(original_link)
-        return Response({'short-link': short_link}, status=status.HTTP_200_OK)
+        short_link, _ = ShortLink.objects.get_or_create(
+            recipe=recipe,
+            defaults={'code': ShortLink.encode(recipe.id)}
+        )
+        return Response(
+            {'short-link': request.build_absolute_uri(
+                f'/s/{short_link.code}/'
+            )},
+            status=status.HTTP_200_OK
+        )
+
+
+async def short_link_redirect(request, code):
+    """
+    Перенаправление с короткой ссылки /s/{code}/ на страницу рецепта.
+    Асинхронное представление: в режиме ASGI не занимает поток,
+    кэш проверяется в цикле событий, а в поток (sync_to_async)
+    запрос уходит только при промахе - за данными из базы.
+    """
+    recipe_id = short_link_cache.get(code)
+    if recipe_id is None:
+        recipe_id = await sync_to_async(find_recipe_id)(code)
+        if recipe_id is None:
+            raise Http404('Короткая ссылка не найдена')
+        short_link_cache.set(code, recipe_id)
+    return redirect(f'/recipes/{recipe_id}/')
@@ -9,6 +9,36 @@ load_dotenv()
 BASE_DIR = Path(__file__).resolve().parent.parent
 # Путь для добавление ингдредиентов "create_ingredinets"
 INGREDIENTS_JSON_PATH = os.path.join(BASE_DIR, 'data', 'ingredients.json')
+# Время жизни кэша выгрузки списка покупок (секунды)
+SHOPPING_CART_CACHE_TIMEOUT = 60 * 60
+# Время жизни кэша ответов списка и страницы рецепта (секунды)
+RESPONSE_CACHE_TIMEOUT = 5 * 60
+# Время жизни фрагментов рецептов; ключ меняется при изменении рецепта
+FRAGMENT_CACHE_TIMEOUT = 24 * 60 * 60
+# Сколько секунд процесс помнит код короткой ссылки
+SHORT_LINK_CACHE_TIMEOUT = 5 * 60
+# Как часто процесс сверяет с базой версии кэша справочников
+# и поколения кэша рецептов (с)
+REFERENCE_CACHE_CHECK_INTERVAL = 5
+# Максимум рецептов в одном пакетном запросе к избранному и корзине
+BATCH_MAX_RECIPES = 100
+# Окно и период полураспада трендового рейтинга (update_trending)
+TRENDING_WINDOW_DAYS = 7
+TRENDING_HALF_LIFE_HOURS = 24
+# Число потоков для фоновых задач на процесс
+BACKGROUND_WORKERS = int(os.getenv('BACKGROUND_WORKERS', 2))
+# Через сколько секунд незавершенная фоновая выгрузка считается неудачной
+BACKGROUND_JOB_TIMEOUT = 10 * 60
+# Сколько секунд хранятся выгрузки списков покупок (cleanup_exports)
+SHOPPING_CART_EXPORT_TTL = 24 * 60 * 60
+# Максимальный размер загружаемого изображения (байты)
+MAX_IMAGE_UPLOAD_SIZE = 5 * 1024 * 1024
+# Тело запроса с изображением в base64 больше самого изображения на треть
+# (и еще на 5% при переносах строк). Для JSON лимит проверяет
+# api.parsers.LimitedJSONParser до чтения тела, ответ - 413.
+DATA_UPLOAD_MAX_MEMORY_SIZE = (
+    MAX_IMAGE_UPLOAD_SIZE * 4 // 3 * 21 // 20 + 64 * 1024
+)
 
 SECRET_KEY = os.getenv('SECRET_KEY')
 
@@ -23,6 +53,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'users.apps.UsersConfig',
     'api.apps.ApiConfig',
@@ -36,6 +67,7 @@ MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
+    'django.middleware.http.ConditionalGetMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
@@ -73,6 +105,18 @@ DATABASES = {
     }
 }
 
+# По умолчанию кэш в памяти процесса; для общего кэша между воркерами
+# задайте CACHE_BACKEND (например, FileBasedCache) и CACHE_LOCATION
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'foodgram'),
+    }
+}
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -119,6 +163,11 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny',
     ],
+    'DEFAULT_PARSER_CLASSES': (
+        'api.parsers.LimitedJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.LimitOffsetPagination',
     'PAGE_SIZE': 6,
 }
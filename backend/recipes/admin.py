@@ -57,7 +57,13 @@ class RecipeIngredientInline(admin.TabularInline):
 
 @admin.register(Recipe)
 class RecipeAdmin(admin.ModelAdmin):
-    list_display = ('name', 'author', 'cooking_time', 'favorite_count')
+    list_display = (
+        'name',
+        'author',
+        'cooking_time',
+        'favorite_count',
+        'shopping_cart_count'
+    )
     search_fields = ('author__username', 'name', 'tags__name')
     list_filter = ('author', 'name', 'tags')
     inlines = [RecipeIngredientInline]
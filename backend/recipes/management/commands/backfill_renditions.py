@@ -0,0 +1,82 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models import F
+
+from api.images import (
+    mark_renditions_ready,
+    process_image,
+    renditions_exist,
+    replace_stored_image,
+)
+from api.response_cache import invalidate_fragments, invalidate_responses
+from recipes.models import Recipe
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        'Создание уменьшенных копий картинок рецептов, '
+        'для которых их еще нет'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Пересоздать копии, даже если файлы уже есть'
+        )
+        parser.add_argument(
+            '--strip-metadata',
+            action='store_true',
+            help=(
+                'Сначала удалить метаданные из всех сохраненных картинок '
+                'рецептов и аватаров (загруженных до очистки при загрузке)'
+            )
+        )
+
+    def strip_metadata(self):
+        stripped = failed = 0
+        for model, field in ((Recipe, 'image'), (User, 'avatar')):
+            instances = model.objects.exclude(**{field: ''}).exclude(
+                **{f'{field}__isnull': True}
+            ).only('pk', field)
+            for instance in instances.iterator():
+                try:
+                    replace_stored_image(instance, field)
+                except Exception as error:
+                    failed += 1
+                    self.stderr.write(
+                        f'Не удалось очистить {getattr(instance, field)}: '
+                        f'{error}'
+                    )
+                else:
+                    stripped += 1
+        invalidate_fragments()
+        invalidate_responses()
+        return stripped, failed
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        if options['strip_metadata']:
+            stripped, failed = self.strip_metadata()
+            self.stdout.write(
+                f'Очищено картинок: {stripped}, ошибок: {failed}.'
+            )
+        recipes = Recipe.objects.exclude(image='').exclude(
+            image__isnull=True
+        ).exclude(renditions_image=F('image')).values_list('image', flat=True)
+        marked = processed = failed = 0
+        for name in recipes.iterator():
+            if not options['force'] and renditions_exist(name):
+                mark_renditions_ready(name)
+                marked += 1
+            elif process_image(name):
+                processed += 1
+            else:
+                failed += 1
+                self.stderr.write(f'Не удалось обработать {name}.')
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано копий: {processed}, отмечено готовых: {marked}, '
+            f'ошибок: {failed}. Время: {time.monotonic() - started:.2f} с.'
+        ))
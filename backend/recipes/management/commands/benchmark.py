@@ -0,0 +1,156 @@
+import json
+import statistics
+import time
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from recipes.management.commands.seed_benchmark_data import BENCH_PREFIX
+from recipes.models import Ingredient, Recipe, Tag
+from users.models import User
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    index = min(len(values) - 1, round(fraction * (len(values) - 1)))
+    return values[index]
+
+
+class Command(BaseCommand):
+    help = (
+        'Замер времени и количества SQL-запросов основных эндпоинтов API '
+        'на данных seed_benchmark_data. Результат выводится в JSON.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=10,
+            help='Количество замеров каждого эндпоинта'
+        )
+        parser.add_argument(
+            '--output',
+            help='Файл для записи результата, по умолчанию stdout'
+        )
+        parser.add_argument(
+            '--search',
+            help=(
+                'Строка поиска ингредиентов, по умолчанию начало '
+                'названия первого ингредиента'
+            )
+        )
+        parser.add_argument(
+            '--no-cache',
+            action='store_true',
+            help='Очищать кэш перед каждым запросом'
+        )
+
+    def get_search(self, search):
+        if search:
+            return search
+        ingredient = Ingredient.objects.order_by('pk').first()
+        return ingredient.name[:3] if ingredient else 'а'
+
+    def get_endpoints(self, user, search):
+        recipe = Recipe.objects.filter(author=user).order_by('pk').first() or (
+            Recipe.objects.order_by('pk').first()
+        )
+        tag = Tag.objects.order_by('pk').first()
+        return {
+            'recipe_list': '/api/recipes/?limit=6',
+            'recipe_list_filtered': (
+                f'/api/recipes/?limit=6&tags={tag.slug}&author={user.id}'
+            ),
+            'recipe_list_favorited': '/api/recipes/?limit=6&is_favorited=1',
+            'recipe_detail': f'/api/recipes/{recipe.id}/',
+            'subscriptions': (
+                '/api/users/subscriptions/?limit=6&recipes_limit=3'
+            ),
+            'ingredient_search': (
+                '/api/ingredients/?' + urlencode({'name': search})
+            ),
+            'download_shopping_cart_pdf': (
+                '/api/recipes/download_shopping_cart/?format=pdf'
+            ),
+            'download_shopping_cart_txt': (
+                '/api/recipes/download_shopping_cart/?format=txt'
+            ),
+        }
+
+    def measure(self, client, url, repeat, no_cache):
+        timings = []
+        queries = []
+        status_code = None
+        for _ in range(repeat):
+            if no_cache:
+                cache.clear()
+            with CaptureQueriesContext(connection) as context:
+                started = time.perf_counter()
+                response = client.get(url)
+                if response.streaming:
+                    b''.join(response.streaming_content)
+                timings.append((time.perf_counter() - started) * 1000)
+            queries.append(len(context.captured_queries))
+            status_code = response.status_code
+        return {
+            'url': url,
+            'status': status_code,
+            'repeat': repeat,
+            'queries': max(queries),
+            'queries_first': queries[0],
+            'min_ms': round(min(timings), 2),
+            'median_ms': round(statistics.median(timings), 2),
+            'p95_ms': round(percentile(timings, 0.95), 2),
+            'max_ms': round(max(timings), 2),
+        }
+
+    def handle(self, *args, **options):
+        # Пользователь с наибольшим списком покупок и числом подписок
+        user = User.objects.filter(
+            username__startswith=BENCH_PREFIX
+        ).annotate(
+            subscriptions_total=Count('subscriber', distinct=True),
+            cart_total=Count('shopping_cart', distinct=True),
+        ).order_by('-cart_total', '-subscriptions_total').first()
+        if user is None:
+            raise CommandError('Сначала выполните seed_benchmark_data.')
+
+        token, _ = Token.objects.get_or_create(user=user)
+        host = next(
+            (host for host in settings.ALLOWED_HOSTS if '*' not in host),
+            'localhost'
+        )
+        client = APIClient(HTTP_HOST=host.lstrip('.'))
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+
+        search = self.get_search(options['search'])
+        results = {
+            name: self.measure(
+                client, url, options['repeat'], options['no_cache']
+            )
+            for name, url in self.get_endpoints(user, search).items()
+        }
+        report = json.dumps({
+            'dataset': {
+                'users': User.objects.count(),
+                'recipes': Recipe.objects.count(),
+                'ingredients': Ingredient.objects.count(),
+                'user': user.username,
+                'ingredient_search': search,
+            },
+            'cache': not options['no_cache'],
+            'endpoints': results,
+        }, ensure_ascii=False, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                file.write(report)
+        else:
+            self.stdout.write(report)
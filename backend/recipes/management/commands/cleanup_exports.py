@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from api.jobs import cleanup_exports
+
+
+class Command(BaseCommand):
+    help = 'Удаление старых выгрузок списков покупок и их файлов'
+
+    def handle(self, *args, **kwargs):
+        deleted = cleanup_exports()
+        self.stdout.write(self.style.SUCCESS(
+            f'Удалено выгрузок: {deleted}.'
+        ))
@@ -1,39 +1,115 @@
+import csv
 import json
 import os
+import time
 
 from django.conf import settings
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 
+from api.reference import ingredient_cache
 from recipes.models import Ingredient
 
 
+CHUNK_SIZE = 64 * 1024
+
+
+def iter_json(file):
+    """
+    Потоково читает JSON-массив объектов, не загружая файл целиком.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    started = False
+    while True:
+        buffer = buffer.lstrip()
+        if started:
+            buffer = buffer.lstrip(',').lstrip()
+        if not buffer:
+            chunk = file.read(CHUNK_SIZE)
+            if not chunk:
+                raise CommandError('Неожиданный конец JSON-файла.')
+            buffer = chunk
+            continue
+        if not started:
+            if buffer[0] != '[':
+                raise CommandError('Ожидался JSON-массив.')
+            buffer = buffer[1:]
+            started = True
+            continue
+        if buffer[0] == ']':
+            return
+        try:
+            item, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            chunk = file.read(CHUNK_SIZE)
+            if not chunk:
+                raise CommandError('Некорректный JSON-файл.')
+            buffer += chunk
+            continue
+        yield item['name'], item['measurement_unit']
+        buffer = buffer[end:]
+
+
+def iter_csv(file):
+    for row in csv.reader(file):
+        if row:
+            yield row[0], row[1]
+
+
 class Command(BaseCommand):
-    help = 'Импорт ингредиентов из JSON-файла'
+    help = 'Импорт ингредиентов из JSON- или CSV-файла'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            nargs='?',
+            default=settings.INGREDIENTS_JSON_PATH,
+            help='Путь к файлу .json или .csv'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Количество строк в одном INSERT'
+        )
 
-    def handle(self, *args, **kwargs):
-        file_path = settings.INGREDIENTS_JSON_PATH
+    def handle(self, *args, **options):
+        file_path = options['path']
+        batch_size = options['batch_size']
         if not os.path.exists(file_path):
             self.stderr.write(
                 self.style.ERROR(f'Файл по пути {file_path} не найден.')
             )
             return
 
-        with open(file_path, 'r', encoding='utf-8') as file:
-            data = json.load(file)
-            for item in data:
-                ingredient, created = Ingredient.objects.get_or_create(
-                    name=item['name'],
-                    measurement_unit=item['measurement_unit']
+        reader = iter_csv if file_path.endswith('.csv') else iter_json
+        started = time.monotonic()
+        count_before = Ingredient.objects.count()
+        seen = set()
+        batch = []
+        total = 0
+        with open(file_path, 'r', encoding='utf-8', newline='') as file:
+            for name, measurement_unit in reader(file):
+                total += 1
+                key = (name.strip(), measurement_unit.strip())
+                if key in seen:
+                    continue
+                seen.add(key)
+                batch.append(
+                    Ingredient(name=key[0], measurement_unit=key[1])
                 )
-                if created:
-                    self.stdout.write(
-                        self.style.SUCCESS(
-                            f'Ингредиент {ingredient.name} добавлен.'
-                        )
-                    )
-                else:
-                    self.stdout.write(
-                        self.style.WARNING(
-                            f'Ингредиент {ingredient.name} уже существует.'
-                        )
+                if len(batch) >= batch_size:
+                    Ingredient.objects.bulk_create(
+                        batch, ignore_conflicts=True
                     )
+                    batch = []
+        if batch:
+            Ingredient.objects.bulk_create(batch, ignore_conflicts=True)
+        ingredient_cache.invalidate()
+
+        created = Ingredient.objects.count() - count_before
+        self.stdout.write(self.style.SUCCESS(
+            f'Прочитано строк: {total}, уникальных: {len(seen)}, '
+            f'добавлено: {created}, уже существовало: {len(seen) - created}. '
+            f'Время: {time.monotonic() - started:.2f} с.'
+        ))
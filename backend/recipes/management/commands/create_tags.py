@@ -1,5 +1,6 @@
 from django.core.management.base import BaseCommand
 
+from api.reference import tag_cache
 from recipes.models import Tag
 
 
@@ -15,6 +16,7 @@ class Command(BaseCommand):
 
         for tag_data in default_tags:
             Tag.objects.create(**tag_data)
+        tag_cache.invalidate()
 
         self.stdout.write(self.style.SUCCESS(
             'Тэги успешно добавлены.'))
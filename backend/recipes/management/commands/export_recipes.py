@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from api.catalogue import CHUNK_SIZE, iter_recipe_lines
+
+
+class Command(BaseCommand):
+    help = 'Выгрузка всех рецептов в формате JSON Lines'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output',
+            help='Файл для записи, по умолчанию stdout'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=CHUNK_SIZE,
+            help='Количество рецептов, читаемых одним запросом'
+        )
+
+    def handle(self, *args, **options):
+        lines = iter_recipe_lines(options['chunk_size'])
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                file.writelines(lines)
+        else:
+            for line in lines:
+                self.stdout.write(line, ending='')
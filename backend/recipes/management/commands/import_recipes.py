@@ -0,0 +1,58 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.catalogue import CHUNK_SIZE, RecipeImporter
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = 'Импорт рецептов из файла JSON Lines'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            help='Путь к файлу .jsonl, "-" для чтения из stdin'
+        )
+        parser.add_argument(
+            '--author',
+            help='Автор рецептов, у которых не указано поле author'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=CHUNK_SIZE,
+            help='Количество рецептов в одной транзакции'
+        )
+
+    def handle(self, *args, **options):
+        author = None
+        if options['author']:
+            author = User.objects.filter(username=options['author']).first()
+            if author is None:
+                raise CommandError(
+                    f'Пользователь {options["author"]} не найден.'
+                )
+        importer = RecipeImporter(
+            default_author=author,
+            allow_local_files=True,
+            chunk_size=options['chunk_size'],
+        )
+        started = time.monotonic()
+        if options['path'] == '-':
+            result = importer.run(sys.stdin)
+        else:
+            try:
+                file = open(options['path'], encoding='utf-8')
+            except OSError as error:
+                raise CommandError(error)
+            with file:
+                result = importer.run(file)
+        for error in result.errors:
+            self.stderr.write(f'Строка {error["line"]}: {error["error"]}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Импортировано рецептов: {result.created}, '
+            f'ошибок: {len(result.errors)}. '
+            f'Время: {time.monotonic() - started:.2f} с.'
+        ))
@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from recipes.models import Favorite, Recipe, ShoppingCart, Subscribe
+from users.models import User
+
+
+def count_subquery(model, field):
+    """
+    Подзапрос количества строк model, ссылающихся на текущий объект.
+    """
+    return Coalesce(Subquery(
+        model.objects.filter(
+            **{field: OuterRef('pk')}
+        ).order_by().values(field).annotate(
+            total=Count('pk')
+        ).values('total')
+    ), Value(0))
+
+
+def recalculate_counters(recipe_model, user_model, favorite_model,
+                         shopping_cart_model, subscribe_model):
+    """
+    Пересчитывает денормализованные счетчики одним UPDATE на таблицу.
+    """
+    with transaction.atomic():
+        recipes = recipe_model.objects.update(
+            favorite_count=count_subquery(favorite_model, 'recipe'),
+            shopping_cart_count=count_subquery(shopping_cart_model, 'recipe'),
+        )
+        users = user_model.objects.update(
+            recipes_count=count_subquery(recipe_model, 'author'),
+            followers_count=count_subquery(subscribe_model, 'subscribed_to'),
+        )
+    return recipes, users
+
+
+class Command(BaseCommand):
+    help = 'Пересчет счетчиков избранного, корзины, рецептов и подписчиков'
+
+    def handle(self, *args, **kwargs):
+        recipes, users = recalculate_counters(
+            Recipe, User, Favorite, ShoppingCart, Subscribe
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Счетчики пересчитаны: рецептов {recipes}, '
+            f'пользователей {users}.'
+        ))
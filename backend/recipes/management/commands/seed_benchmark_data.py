@@ -0,0 +1,190 @@
+import random
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from api.response_cache import invalidate_fragments, invalidate_responses
+from recipes.management.commands.recalculate_counters import (
+    recalculate_counters,
+)
+from recipes.models import (
+    RECIPE_SEARCH_VECTOR,
+    Favorite,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    ShoppingCart,
+    Subscribe,
+    Tag,
+)
+from users.models import User
+
+
+BENCH_PREFIX = 'bench_'
+
+
+def random_pairs(left, right, count, rng, exclude_same=False):
+    """
+    Уникальные случайные пары (left, right) в количестве до count.
+    """
+    limit = len(left) * len(right)
+    if exclude_same:
+        limit -= len(set(left) & set(right))
+    pairs = set()
+    while len(pairs) < min(count, limit):
+        pair = (rng.choice(left), rng.choice(right))
+        if not (exclude_same and pair[0] == pair[1]):
+            pairs.add(pair)
+    return pairs
+
+
+class Command(BaseCommand):
+    help = 'Генерация тестовых данных для бенчмарка API'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--recipes', type=int, default=1000)
+        parser.add_argument('--favorites', type=int, default=5000)
+        parser.add_argument('--carts', type=int, default=2000)
+        parser.add_argument('--subscriptions', type=int, default=2000)
+        parser.add_argument(
+            '--ingredients-per-recipe', type=int, default=8
+        )
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--clear',
+            action='store_true',
+            help='Удалить ранее сгенерированные данные и выйти'
+        )
+
+    def handle(self, *args, **options):
+        if options['clear']:
+            deleted, _ = User.objects.filter(
+                username__startswith=BENCH_PREFIX
+            ).delete()
+            invalidate_responses()
+            self.stdout.write(self.style.SUCCESS(
+                f'Удалено объектов: {deleted}.'
+            ))
+            return
+
+        # Порядок id фиксирован: от него зависят выборки из rng
+        ingredient_ids = list(
+            Ingredient.objects.order_by('pk').values_list('id', flat=True)
+        )
+        tag_ids = list(Tag.objects.order_by('pk').values_list('id', flat=True))
+        if not ingredient_ids or not tag_ids:
+            raise CommandError(
+                'Сначала выполните create_ingredients и create_tags.'
+            )
+        if User.objects.filter(username__startswith=BENCH_PREFIX).exists():
+            raise CommandError(
+                'Данные уже сгенерированы, удалите их через --clear.'
+            )
+
+        rng = random.Random(options['seed'])
+        batch_size = options['batch_size']
+        started = time.monotonic()
+        with transaction.atomic():
+            password = make_password(None)
+            User.objects.bulk_create(
+                (
+                    User(
+                        username=f'{BENCH_PREFIX}{number}',
+                        email=f'{BENCH_PREFIX}{number}@example.com',
+                        first_name='Bench',
+                        last_name=str(number),
+                        password=password,
+                    )
+                    for number in range(options['users'])
+                ),
+                batch_size=batch_size
+            )
+            user_ids = list(User.objects.filter(
+                username__startswith=BENCH_PREFIX
+            ).order_by('pk').values_list('id', flat=True))
+
+            Recipe.objects.bulk_create(
+                (
+                    Recipe(
+                        author_id=rng.choice(user_ids),
+                        name=f'Рецепт {number}',
+                        text=f'Описание рецепта {number}',
+                        cooking_time=rng.randint(5, 120),
+                    )
+                    for number in range(options['recipes'])
+                ),
+                batch_size=batch_size
+            )
+            recipes = Recipe.objects.filter(author_id__in=user_ids)
+            recipes.update(search_vector=RECIPE_SEARCH_VECTOR)
+            recipe_ids = list(
+                recipes.order_by('pk').values_list('id', flat=True)
+            )
+
+            per_recipe = min(
+                options['ingredients_per_recipe'], len(ingredient_ids)
+            )
+            RecipeIngredient.objects.bulk_create(
+                (
+                    RecipeIngredient(
+                        recipe_id=recipe_id,
+                        ingredient_id=ingredient_id,
+                        amount=rng.randint(1, 500),
+                    )
+                    for recipe_id in recipe_ids
+                    for ingredient_id in rng.sample(
+                        ingredient_ids, per_recipe
+                    )
+                ),
+                batch_size=batch_size
+            )
+            Recipe.tags.through.objects.bulk_create(
+                (
+                    Recipe.tags.through(recipe_id=recipe_id, tag_id=tag_id)
+                    for recipe_id in recipe_ids
+                    for tag_id in rng.sample(
+                        tag_ids, rng.randint(1, len(tag_ids))
+                    )
+                ),
+                batch_size=batch_size
+            )
+            for model, count in (
+                (Favorite, options['favorites']),
+                (ShoppingCart, options['carts']),
+            ):
+                model.objects.bulk_create(
+                    (
+                        model(user_id=user_id, recipe_id=recipe_id)
+                        for user_id, recipe_id in random_pairs(
+                            user_ids, recipe_ids, count, rng
+                        )
+                    ),
+                    batch_size=batch_size
+                )
+            Subscribe.objects.bulk_create(
+                (
+                    Subscribe(
+                        subscriber_id=subscriber, subscribed_to_id=author
+                    )
+                    for subscriber, author in random_pairs(
+                        user_ids, user_ids, options['subscriptions'], rng,
+                        exclude_same=True
+                    )
+                ),
+                batch_size=batch_size
+            )
+            recalculate_counters(
+                Recipe, User, Favorite, ShoppingCart, Subscribe
+            )
+            invalidate_fragments()
+            invalidate_responses()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Сгенерировано: пользователей {len(user_ids)}, '
+            f'рецептов {len(recipe_ids)}. '
+            f'Время: {time.monotonic() - started:.2f} с.'
+        ))
@@ -0,0 +1,46 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from api.response_cache import invalidate_responses
+from recipes.models import Favorite, RecipeTrend, ShoppingCart
+
+
+def calculate_trending():
+    """
+    Считает рейтинг по недавним добавлениям в избранное и корзину:
+    вклад каждого добавления затухает вдвое за TRENDING_HALF_LIFE_HOURS.
+    """
+    now = timezone.now()
+    since = now - timedelta(days=settings.TRENDING_WINDOW_DAYS)
+    half_life = settings.TRENDING_HALF_LIFE_HOURS * 3600
+    scores = defaultdict(float)
+    for model in (Favorite, ShoppingCart):
+        rows = model.objects.filter(created__gte=since).values_list(
+            'recipe_id', 'created'
+        )
+        for recipe_id, created in rows.iterator():
+            age = (now - created).total_seconds()
+            scores[recipe_id] += 0.5 ** (age / half_life)
+    return scores
+
+
+class Command(BaseCommand):
+    help = 'Пересчет трендового рейтинга рецептов'
+
+    def handle(self, *args, **kwargs):
+        scores = calculate_trending()
+        with transaction.atomic():
+            RecipeTrend.objects.all().delete()
+            RecipeTrend.objects.bulk_create(
+                RecipeTrend(recipe_id=recipe_id, score=score)
+                for recipe_id, score in scores.items()
+            )
+            invalidate_responses()
+        self.stdout.write(self.style.SUCCESS(
+            f'Трендовый рейтинг обновлен для {len(scores)} рецептов.'
+        ))
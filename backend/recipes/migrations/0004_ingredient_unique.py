@@ -0,0 +1,58 @@
+# Generated by Django 3.2.3 on 2026-10-18 02:28
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def merge_duplicate_ingredients(apps, schema_editor):
+    """
+    Объединяет ингредиенты с одинаковыми названием и единицей
+    измерения в самый старый. Строки рецептов переводятся на него,
+    а если в рецепте он уже есть - количества складываются
+    (иначе нарушится unique_recipe_ingredient).
+    """
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+    # Проверки внешних ключей сразу, иначе ALTER TABLE ниже упадет
+    # из-за отложенных триггеров
+    schema_editor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+    groups = Ingredient.objects.order_by().values(
+        'name', 'measurement_unit'
+    ).annotate(keep=Min('pk'), total=Count('pk')).filter(total__gt=1)
+    for group in groups:
+        duplicates = Ingredient.objects.filter(
+            name=group['name'], measurement_unit=group['measurement_unit']
+        ).exclude(pk=group['keep'])
+        rows = RecipeIngredient.objects.filter(
+            ingredient__in=duplicates
+        ).order_by('pk')
+        for row in rows:
+            kept = RecipeIngredient.objects.filter(
+                recipe_id=row.recipe_id, ingredient_id=group['keep']
+            ).first()
+            if kept is None:
+                row.ingredient_id = group['keep']
+                row.save(update_fields=['ingredient'])
+            else:
+                kept.amount += row.amount
+                kept.save(update_fields=['amount'])
+                row.delete()
+        duplicates.delete()
+    schema_editor.execute('SET CONSTRAINTS ALL DEFERRED')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0003_shortlink'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            merge_duplicate_ingredients, migrations.RunPython.noop
+        ),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('name', 'measurement_unit'), name='unique_ingredient_measurement_unit'),
+        ),
+    ]
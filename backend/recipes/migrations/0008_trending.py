@@ -0,0 +1,55 @@
+# Generated by Django 3.2.3 on 2026-10-18 02:30
+
+from datetime import datetime, timezone
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+# Дата добавления старых записей неизвестна. Чтобы они не попали
+# в трендовое окно разом, им ставится дата далеко за его пределами.
+UNKNOWN_CREATED = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def backfill_created(apps, schema_editor):
+    for model_name in ('Favorite', 'ShoppingCart'):
+        apps.get_model('recipes', model_name).objects.update(
+            created=UNKNOWN_CREATED
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_recipe_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeTrend',
+            fields=[
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='trend', serialize=False, to='recipes.recipe', verbose_name='Рецепт')),
+                ('score', models.FloatField(db_index=True, verbose_name='Рейтинг')),
+            ],
+            options={
+                'verbose_name': 'Трендовый рейтинг',
+                'verbose_name_plural': 'Трендовые рейтинги',
+            },
+        ),
+        migrations.AddField(
+            model_name='favorite',
+            name='created',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now, verbose_name='Дата добавления'),
+        ),
+        migrations.AddField(
+            model_name='shoppingcart',
+            name='created',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now, verbose_name='Дата добавления'),
+        ),
+        migrations.RunPython(backfill_created, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-favorite_count', '-pub_date'], name='recipe_popular_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.3 on 2026-10-18 02:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0011_referenceversion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='renditions_image',
+            field=models.CharField(blank=True, editable=False, max_length=100, verbose_name='Картинка с копиями'),
+        ),
+    ]
@@ -1,9 +1,19 @@
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
 from django.core.validators import RegexValidator
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F
+from django.utils import timezone
 
 from users.models import User
 
 
+SEARCH_CONFIG = 'russian'
+
+BASE62_ALPHABET = (
+    '0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ'
+)
+
 slug_validator = RegexValidator(
     regex=r'^[-a-zA-Z0-9_]+$',
     message="""
@@ -44,11 +54,23 @@ class Ingredient(models.Model):
     class Meta:
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['name', 'measurement_unit'],
+                name='unique_ingredient_measurement_unit'
+            )
+        ]
 
     def __str__(self):
         return self.name
 
 
+RECIPE_SEARCH_VECTOR = (
+    SearchVector('name', weight='A', config=SEARCH_CONFIG)
+    + SearchVector('text', weight='B', config=SEARCH_CONFIG)
+)
+
+
 class Recipe(models.Model):
     """
     Модель Рецептов
@@ -80,18 +102,94 @@ class Recipe(models.Model):
         auto_now_add=True,
         verbose_name='Дата публикации'
     )
+    updated = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата изменения'
+    )
+    search_vector = SearchVectorField(null=True, editable=False)
+    # Картинка, для которой созданы уменьшенные копии (api.images)
+    renditions_image = models.CharField(
+        'Картинка с копиями',
+        max_length=100,
+        blank=True,
+        editable=False
+    )
+    favorite_count = models.PositiveIntegerField(
+        'Кол-во избранных',
+        default=0,
+        editable=False
+    )
+    shopping_cart_count = models.PositiveIntegerField(
+        'Кол-во в списках покупок',
+        default=0,
+        editable=False
+    )
 
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
+        indexes = [
+            GinIndex(fields=['search_vector'], name='recipe_search_idx'),
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='recipe_pub_date_id_idx'
+            ),
+            models.Index(
+                fields=['-favorite_count', '-pub_date'],
+                name='recipe_popular_idx'
+            ),
+            models.Index(
+                fields=['author', '-pub_date'],
+                name='recipe_author_pub_date_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.name
 
-    def favorite_count(self):
-        return self.favorites.count()  # type: ignore
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            Recipe.objects.filter(pk=self.pk).update(
+                search_vector=RECIPE_SEARCH_VECTOR
+            )
+            if adding:
+                User.objects.filter(pk=self.author_id).update(
+                    recipes_count=F('recipes_count') + 1
+                )
+
 
-    favorite_count.short_description = 'Кол-во избранных'
+class ShortLink(models.Model):
+    """
+    Модель короткой ссылки на рецепт.
+    """
+    recipe = models.OneToOneField(
+        Recipe,
+        related_name='short_link',
+        on_delete=models.CASCADE,
+        verbose_name='Рецепт'
+    )
+    code = models.CharField('Код', max_length=16, unique=True)
+
+    class Meta:
+        verbose_name = 'Короткая ссылка'
+        verbose_name_plural = 'Короткие ссылки'
+
+    def __str__(self):
+        return self.code
+
+    @staticmethod
+    def encode(number):
+        """
+        Кодирует число в base62.
+        """
+        code = ''
+        while True:
+            number, remainder = divmod(number, len(BASE62_ALPHABET))
+            code = BASE62_ALPHABET[remainder] + code
+            if not number:
+                return code
 
 
 class RecipeIngredient(models.Model):
@@ -132,6 +230,11 @@ class Favorite(models.Model):
         on_delete=models.CASCADE,
         verbose_name='Рецепт',
     )
+    created = models.DateTimeField(
+        'Дата добавления',
+        default=timezone.now,
+        db_index=True
+    )
 
     class Meta:
         verbose_name = 'Избранное'
@@ -164,6 +267,11 @@ class ShoppingCart(models.Model):
         on_delete=models.CASCADE,
         verbose_name='Рецепт'
     )
+    created = models.DateTimeField(
+        'Дата добавления',
+        default=timezone.now,
+        db_index=True
+    )
 
     class Meta:
         verbose_name = 'Список покупок'
@@ -210,3 +318,83 @@ class Subscribe(models.Model):
     def __str__(self):
         return (f'{self.subscriber.username}'
                 f'подписан на {self.subscribed_to.username}')
+
+
+class ShoppingCartExport(models.Model):
+    """
+    Модель фоновой выгрузки списка покупок.
+    """
+    PENDING = 'pending'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (PENDING, 'В обработке'),
+        (DONE, 'Готово'),
+        (FAILED, 'Ошибка'),
+    )
+
+    user = models.ForeignKey(
+        User,
+        related_name='shopping_cart_exports',
+        on_delete=models.CASCADE,
+        verbose_name='Пользователь'
+    )
+    export_format = models.CharField('Формат', max_length=10)
+    status = models.CharField(
+        'Статус',
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default=PENDING
+    )
+    file = models.FileField(
+        'Файл',
+        upload_to='shopping_carts/',
+        blank=True
+    )
+    created = models.DateTimeField('Дата создания', auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Выгрузка списка покупок'
+        verbose_name_plural = 'Выгрузки списков покупок'
+        ordering = ['-created']
+
+    def __str__(self):
+        return f'Выгрузка {self.id} пользователя {self.user}'
+
+
+class RecipeTrend(models.Model):
+    """
+    Предрассчитанный трендовый рейтинг рецепта.
+    """
+    recipe = models.OneToOneField(
+        Recipe,
+        primary_key=True,
+        related_name='trend',
+        on_delete=models.CASCADE,
+        verbose_name='Рецепт'
+    )
+    score = models.FloatField('Рейтинг', db_index=True)
+
+    class Meta:
+        verbose_name = 'Трендовый рейтинг'
+        verbose_name_plural = 'Трендовые рейтинги'
+
+    def __str__(self):
+        return f'{self.recipe} - {self.score:.2f}'
+
+
+class ReferenceVersion(models.Model):
+    """
+    Время последнего изменения справочника (тегов, ингредиентов)
+    или поколения кэша рецептов. По нему процессы сервера узнают,
+    что их кэш устарел.
+    """
+    name = models.CharField('Справочник', max_length=100, primary_key=True)
+    updated = models.DateTimeField('Дата изменения', default=timezone.now)
+
+    class Meta:
+        verbose_name = 'Версия справочника'
+        verbose_name_plural = 'Версии справочников'
+
+    def __str__(self):
+        return f'{self.name} - {self.updated}'
@@ -7,7 +7,14 @@ from users.models import User
 @admin.register(User)
 class UserAdmin(admin.ModelAdmin):
     form = CustomUserChangeForm
-    list_display = ('username', 'email', 'first_name', 'last_name')
+    list_display = (
+        'username',
+        'email',
+        'first_name',
+        'last_name',
+        'recipes_count',
+        'followers_count'
+    )
     search_fields = ('username',)
     list_filter = ('username', 'email')
     empty_value_display = '-пусто-'
@@ -25,6 +25,16 @@ class User(AbstractUser):
         null=True,
         blank=True
     )
+    recipes_count = models.PositiveIntegerField(
+        'Кол-во рецептов',
+        default=0,
+        editable=False
+    )
+    followers_count = models.PositiveIntegerField(
+        'Кол-во подписчиков',
+        default=0,
+        editable=False
+    )
 
     class Meta:
         ordering = ['username']